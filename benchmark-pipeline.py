@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+import warnings
+
+warnings.simplefilter(action="ignore", category=FutureWarning)
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+import epiphany as ep
+import synthetic
+
+# Times each stage of the ingestion pipeline and the aggregate functions over
+# synthetic corpora of increasing size, and compares the results against the
+# baseline committed in benchmarks/baseline.json.
+#
+#   ./benchmark-pipeline.py                         # 10 and 100 events
+#   ./benchmark-pipeline.py --sizes 10              # quick run
+#   ./benchmark-pipeline.py --sizes 10,1000         # large run, about 6 minutes
+#   ./benchmark-pipeline.py --sizes 10,100 --save-baseline
+#
+# The committed baseline covers 10, 100 and 1,000 events.  10,000 events would
+# take about an hour, so it isn't baselined.
+#
+# Exits non-zero if any stage is slower than its baseline by more than the
+# tolerance, if there is no baseline for a size, or if a corpus produces a
+# different number of rows than its baseline, which means the pipeline's output
+# changed and the baseline needs re-saving.  The flatteners and pairing take
+# roughly half a second per event, so sizes much beyond a few hundred events
+# take a long time.
+
+aggregate_functions = [
+    ("get_runner_win_rate", lambda f, p: ep.get_runner_win_rate(f)),
+    ("get_corp_win_rate", lambda f, p: ep.get_corp_win_rate(f)),
+    ("get_runner_win_rate_by_event_month", lambda f, p: ep.get_runner_win_rate_by_event_month(f)),
+    ("get_corp_win_rate_by_event_month", lambda f, p: ep.get_corp_win_rate_by_event_month(f)),
+    ("get_grouped_player_results", lambda f, p: ep.get_grouped_player_results(f)),
+    ("get_paired_winrate", lambda f, p: ep.get_paired_winrate(p)),
+    ("get_corp_popularity_by_month", lambda f, p: ep.get_corp_popularity_by_month(f)),
+    ("get_runner_popularity_by_month", lambda f, p: ep.get_runner_popularity_by_month(f)),
+]
+
+
+def timed(timings, stage, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+    return result
+
+
+# timing_stage returns a stage context for ep.get_event_frames that adds each
+# stage's time to timings under the stage's name.
+def timing_stage(timings):
+    @contextmanager
+    def stage(event, name, rows_in=None):
+        start = time.perf_counter()
+        try:
+            yield {}
+        finally:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+    return stage
+
+
+# benchmark_corpus returns a dict of stage name to total seconds for one corpus.
+# Per-event stages, those of ep.get_event_frames, are summed over all events.
+# aggregate_concat times the final concatenation in aggregate_tournament_data
+# over the per-event frames already built, rather than running the whole
+# pipeline a second time.
+def benchmark_corpus(data_dir, tournaments, cards_file):
+    timings = {}
+    id_df = timed(timings, "get_id_data_from_file", ep.get_id_data_from_file, cards_file)
+
+    flattened = []
+    paired = []
+    stage = timing_stage(timings)
+    for t, s in tournaments:
+        f, p = ep.get_event_frames(id_df, data_dir, t, s, stage)
+        flattened.append(f)
+        paired.append(p)
+
+    flattened_matches, paired_matches = timed(
+        timings, "aggregate_concat", ep.concat_event_frames, flattened, paired
+    )
+
+    for name, fn in aggregate_functions:
+        timed(timings, name, fn, flattened_matches, paired_matches)
+
+    timings["rows_flattened"] = len(flattened_matches)
+    timings["rows_paired"] = len(paired_matches)
+    return timings
+
+
+# compare_to_baseline returns a list of (size, stage, baseline, current) for
+# stages that regressed by more than tolerance.  Differences below min_seconds
+# are treated as noise.
+def compare_to_baseline(results, baseline, tolerance, min_seconds=0.01):
+    regressions = []
+    for size, timings in results.items():
+        if size not in baseline:
+            continue
+        for stage, seconds in timings.items():
+            if stage.startswith("rows_"):
+                continue
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                continue
+            if seconds > base * (1 + tolerance) and seconds - base > min_seconds:
+                regressions.append((size, stage, base, seconds))
+    return regressions
+
+
+# compare_rows returns a list of (size, rows, baseline, current) where the corpus
+# produced different row counts than the baseline's.  The pipeline's output has
+# changed, so its timings aren't comparable until the baseline is re-saved.
+def compare_rows(results, baseline):
+    changed = []
+    for size, timings in results.items():
+        for rows in ["rows_flattened", "rows_paired"]:
+            base = baseline.get(size, {}).get(rows)
+            if base is not None and base != timings[rows]:
+                changed.append((size, rows, base, timings[rows]))
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the epiphany ingestion pipeline")
+    parser.add_argument("--sizes", default="10,100", help="comma separated event counts")
+    parser.add_argument("--data-dir", help="write synthetic corpora here instead of a temp dir")
+    parser.add_argument("--cards", default="data/cards/cards.json")
+    parser.add_argument("--baseline", default="benchmarks/baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown ratio")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            data_dir = os.path.join(args.data_dir or tmp, f"synthetic-{size}")
+            print(f"Generating {size} events in {data_dir}", file=sys.stderr)
+            tournaments = synthetic.generate_corpus(
+                data_dir, size, cards_file=args.cards, seed=args.seed
+            )
+            print(f"Benchmarking {size} events", file=sys.stderr)
+            results[str(size)] = benchmark_corpus(data_dir, tournaments, args.cards)
+
+    print(pd.DataFrame(results).to_string(float_format=lambda x: f"{x:.4f}"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.save_baseline:
+        baseline.update(results)
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+
+    missing = [size for size in results if size not in baseline]
+    for size in missing:
+        print(f"\nNo baseline for {size} events in {args.baseline}; run with --save-baseline")
+    changed = compare_rows(results, baseline)
+    for size, rows, base, count in changed:
+        print(
+            f"ROWS CHANGED {size} events: {rows} {base} -> {count}; "
+            "timings aren't comparable, re-save the baseline"
+        )
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for size, stage, base, seconds in regressions:
+        print(
+            f"REGRESSION {size} events: {stage} {base:.4f}s -> {seconds:.4f}s ({seconds / base:.2f}x)"
+        )
+
+    return 1 if regressions or missing or changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
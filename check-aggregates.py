@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+import warnings
+
+warnings.simplefilter(action="ignore", category=FutureWarning)
+
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import epiphany as ep
+import epiphany_dist as dist
+import synthetic
+
+# Checks the vectorized aggregates and distributions against straightforward reference
+# implementations over a synthetic corpus, so refactoring their index
+# arithmetic can't silently change results.
+#
+#   ./check-aggregates.py
+#   ./check-aggregates.py --events 100 --seed 3
+#
+# Exits non-zero if any check fails.
+
+
+# brute_force_rolling regroups the rows of every trailing window separately,
+# the way get_rolling_sums would without running sums.
+def brute_force_rolling(df, keys, values, window, step):
+    days = df["date"].dt.normalize()
+    window_days = pd.Timedelta(window).days
+    ends = pd.date_range(start=days.max(), end=days.min(), freq=f"-{pd.Timedelta(step).days}D")
+    frames = []
+    for end in ends:
+        in_window = (days > end - pd.Timedelta(days=window_days)) & (days <= end)
+        sums = df[in_window].groupby(keys)[values].sum().reset_index()
+        frames.append(sums.assign(window_end=end))
+    return pd.concat(frames, ignore_index=True)
+
+
+def check_rolling(flattened_matches):
+    for side, by, window, step in itertools.product(
+        ["corp", "runner"], ["identity", "faction"], ["28D", "7D"], ["1D", "7D"]
+    ):
+        keys = ep.side_keys(side, by)
+        df = flattened_matches.dropna(subset=keys)
+        sort = ["window_end"] + keys
+
+        expected = brute_force_rolling(df.assign(size=1), keys, ["size"], window, step)
+        expected = expected[expected["size"] > 0]
+        expected["pct"] = expected["size"] / expected.groupby("window_end")["size"].transform("sum")
+        actual = ep.get_popularity_rolling(flattened_matches, side, window, step, by)
+        pd.testing.assert_frame_equal(
+            actual.sort_values(sort)[sort + ["size", "pct"]].reset_index(drop=True),
+            expected.sort_values(sort)[sort + ["size", "pct"]].reset_index(drop=True),
+            check_dtype=False,
+            obj=f"{side} popularity by {by}, window {window}, step {step}",
+        )
+
+        values = [f"{side}Win", f"{side}Play"]
+        expected = brute_force_rolling(df, keys, values, window, step)
+        expected = expected[expected[f"{side}Play"] > 0]
+        expected["win_ratio"] = expected[f"{side}Win"] / expected[f"{side}Play"]
+        actual = ep.get_win_rate_rolling(flattened_matches, side, window, step, by).rename(
+            columns={"total_wins": f"{side}Win", "matches_played": f"{side}Play"}
+        )
+        columns = sort + values + ["win_ratio"]
+        pd.testing.assert_frame_equal(
+            actual.sort_values(sort)[columns].reset_index(drop=True),
+            expected.sort_values(sort)[columns].reset_index(drop=True),
+            check_dtype=False,
+            obj=f"{side} win rate by {by}, window {window}, step {step}",
+        )
+
+
+# direct_reflected_kde evaluates a Gaussian KDE of x on grid, reflecting the
+# samples about 0 and 1, with the bandwidth get_win_ratio_kde uses.
+def direct_reflected_kde(x, grid, bw_adjust):
+    bw = x.std(ddof=1) * len(x) ** (-1 / 5) * bw_adjust
+    samples = np.concatenate([x, -x, 2 - x])
+    d = (grid[:, None] - samples[None, :]) / bw
+    return np.exp(-0.5 * d * d).sum(axis=1) / (np.sqrt(2 * np.pi) * bw * len(x))
+
+
+# Single reflections about 0 and 1 miss the tails of very wide kernels, so the
+# curves integrate to slightly under 1; area_tolerance allows for that.
+def check_win_ratio_kde(flattened_matches, bw_adjust=0.8, tolerance=0.01, area_tolerance=0.05):
+    for side in ["corp", "runner"]:
+        win_rate = (
+            ep.get_corp_win_rate_by_event_month(flattened_matches)
+            if side == "corp"
+            else ep.get_runner_win_rate_by_event_month(flattened_matches)
+        )
+        keys = [f"{side}Identity", "YM"]
+        kde = dist.get_win_ratio_kde(win_rate, bw_adjust=bw_adjust, cache=False)
+        assert len(kde) > 0, f"no {side} curves"
+        samples = win_rate.dropna(subset=keys + ["win_ratio"]).groupby(keys)["win_ratio"]
+        for group, curve in kde.groupby(keys):
+            x = samples.get_group(group).to_numpy(dtype=float)
+            grid = curve["win_ratio"].to_numpy()
+            density = curve["density"].to_numpy()
+            expected = direct_reflected_kde(x, grid, bw_adjust)
+            error = np.abs(density - expected).max() / expected.max()
+            assert error < tolerance, f"{side} {group}: relative error {error:.4f}"
+            area = np.trapz(density, grid)
+            assert (
+                abs(area - 1) < area_tolerance
+            ), f"{side} {group}: density integrates to {area:.4f}"
+
+        # groups with fewer than two distinct values get no curve
+        distinct = samples.nunique()
+        assert set(kde.groupby(keys).size().index) == set(
+            distinct[distinct > 1].index
+        ), f"{side} curves don't match the groups with two or more distinct win ratios"
+
+    # edits to a returned frame don't reach later cache hits
+    first = dist.get_win_ratio_kde(win_rate)
+    first["density"] = 0.0
+    assert dist.get_win_ratio_kde(win_rate)["density"].max() > 0, "cached KDE was modified"
+
+
+# check_trace_memory runs a small and a large event through a traced pipeline in
+# both orders.  Each event's peak memory must reflect its own size, not the
+# frames kept from whichever event ran first.
+def check_trace_memory(cards_file):
+    id_df = ep.get_id_data_from_file(cards_file)
+    with tempfile.TemporaryDirectory() as data_dir:
+        sizes = {"small": (8, 3), "large": (64, 7)}
+        for prefix, (players, rounds) in sizes.items():
+            event, claims = synthetic.generate_event(
+                "cobra", prefix, "2024-01-06", players=players, rounds=rounds, seed=1
+            )
+            synthetic.write_event(data_dir, prefix, "cobra", event, claims)
+
+        for order in [["small", "large"], ["large", "small"]]:
+            trace = ep.PipelineTrace()
+            ep.aggregate_tournament_data(id_df, [[t, "cobra"] for t in order], data_dir, trace)
+            peaks = trace.event_summary().set_index("event")["peak_memory"]
+            assert peaks["small"] < peaks["large"], (
+                f"{' then '.join(order)}: small event peak {peaks['small']} "
+                f"not below large event peak {peaks['large']}"
+            )
+            stages = trace.to_dataframe()
+            stages = stages[stages["stage"] == "load_json"].set_index("event")["peak_memory"]
+            assert stages["small"] < stages["large"], (
+                f"{' then '.join(order)}: small event load_json peak {stages['small']} "
+                f"not below large event load_json peak {stages['large']}"
+            )
+
+
+# each check is called with the synthetic corpus's flattened and paired frames
+# and the cards file
+checks = [
+    ("rolling sums", lambda flattened, paired, cards: check_rolling(flattened)),
+    ("win ratio KDE", lambda flattened, paired, cards: check_win_ratio_kde(flattened)),
+    ("trace memory", lambda flattened, paired, cards: check_trace_memory(cards)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check epiphany aggregates on synthetic data")
+    parser.add_argument("--events", type=int, default=40)
+    parser.add_argument("--data-dir", help="write the synthetic corpus here instead of a temp dir")
+    parser.add_argument("--cards", default="data/cards/cards.json")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(args.data_dir or tmp, f"synthetic-{args.events}")
+        print(f"Generating {args.events} events in {data_dir}", file=sys.stderr)
+        tournaments = synthetic.generate_corpus(
+            data_dir, args.events, cards_file=args.cards, seed=args.seed
+        )
+        id_df = ep.get_id_data_from_file(args.cards)
+        flattened, paired = ep.aggregate_tournament_data(id_df, tournaments, data_dir)
+
+    failures = 0
+    for name, check in checks:
+        try:
+            check(flattened, paired, args.cards)
+            print(f"ok   {name}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL {name}\n{e}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
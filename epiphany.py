@@ -1,12 +1,18 @@
+import fnmatch
+import hashlib
 import json
 import logging
 import math
 import matplotlib.pyplot as plt
+import numpy as np
 import os
 import pandas as pd
 import re
 import requests
 import seaborn as sns
+import time
+import tracemalloc
+from contextlib import contextmanager
 from unidecode import unidecode
 
 # Functions for processing tournament data
@@ -38,20 +44,6 @@ mojibake = {
     "TÄ�o Salonga: Telepresence Magician" : "René \"Loup\" Arcemont: Party Animal"
 }
 
-tai_members = ["Baa Ram Wu", "AugustusCaesar", "HaverOfFun", "xdg", "aksu", "Gathzen", "Jai", "rubenpieters", "profwacko"]
-
-def is_tai(player):
-    return player in tai_members
-
-def tai_matches(row):
-    return is_tai(row.corp_player) or is_tai(row.runner_player)
-
-def tai_corp_matches(row):
-    return is_tai(row.corp_player)
-
-def tai_runner_matches(row):
-    return is_tai(row.runner_player)
-
 def normalize_title(title):
     # Remove accents and convert to lowercase
     return unidecode(title).lower()
@@ -138,6 +130,221 @@ def get_tournament_players(id_df, raw_data, abr_claims_data):
         "id", "name", "rank", "corpIdentity", "corpFaction", "runnerIdentity", "runnerFaction", "tournamentName", "abrName",
     ]]
 
+# Data manifest and meta registry
+#
+# get_data_manifest indexes the event files directly under data_dir (so
+# data/bad, data/orig and data/cards are never included) and returns one row
+# per event with its prefix, date, source, file sizes and sha256 hashes, player
+# and round counts, and whether a matching -abr.json exists.  The index is kept
+# in data_dir/manifest.json and only files whose mtime or size changed since
+# the last call are re-read.
+#
+# Metas are named by JSON files in metas/.  A meta has a "name" for titles, a
+# "file_prefix" for output files, and either an explicit "tournaments" array
+# or a date range that is resolved against the manifest:
+#
+# {
+#   "name": "RWR 2024-05 Banlist",
+#   "file_prefix": "rwr-2024-05",
+#   "start_date": "2024-05-25",
+#   "end_date": "2024-06-02",
+#   "exclude": ["2024-05-25-some-event"]
+# }
+#
+# end_date may be omitted for the current meta.  exclude holds fnmatch
+# patterns matched against event prefixes.  Only events with ABR data are
+# included, since aggregate_tournament_data needs it.
+
+data_file_pattern = re.compile(r"^(.+)-(cobra|aesops|abr)\.json$")
+
+def index_data_file(path, prefix, kind, st):
+    with open(path, "rb") as f:
+        raw = f.read()
+    entry = {
+        "prefix": prefix,
+        "kind": kind,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": hashlib.sha256(raw).hexdigest(),
+    }
+    data = json.loads(raw)
+    if kind == "abr":
+        entry["claims"] = len(data)
+    else:
+        entry["name"] = data.get("name")
+        entry["event_date"] = data.get("date")
+        entry["players"] = len(data.get("players", []))
+        entry["rounds"] = len(data.get("rounds", []))
+    return entry
+
+def get_data_manifest(data_dir="data", manifest_file=None) -> pd.DataFrame:
+    if manifest_file is None:
+        manifest_file = os.path.join(data_dir, "manifest.json")
+
+    previous = {}
+    if os.path.exists(manifest_file):
+        previous = get_json_from_file(manifest_file).get("files", {})
+
+    files = {}
+    for entry in os.scandir(data_dir):
+        match = data_file_pattern.match(entry.name)
+        if not match or not entry.is_file():
+            continue
+        st = entry.stat()
+        old = previous.get(entry.name)
+        if old and old["mtime_ns"] == st.st_mtime_ns and old["size"] == st.st_size:
+            files[entry.name] = old
+        else:
+            files[entry.name] = index_data_file(entry.path, match.group(1), match.group(2), st)
+
+    if files != previous:
+        tmp = f"{manifest_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": files}, f, indent=1, sort_keys=True)
+        os.replace(tmp, manifest_file)
+
+    abr = {e["prefix"]: e for e in files.values() if e["kind"] == "abr"}
+    events = []
+    for e in files.values():
+        if e["kind"] == "abr":
+            continue
+        claims = abr.get(e["prefix"], {})
+        date_match = re.match(r"^\d{4}-\d{2}-\d{2}", e["prefix"])
+        events.append(
+            {
+                "prefix": e["prefix"],
+                "date": date_match.group(0) if date_match else e["event_date"],
+                "source": e["kind"],
+                "name": e["name"],
+                "players": e["players"],
+                "rounds": e["rounds"],
+                "size": e["size"],
+                "sha256": e["sha256"],
+                "has_abr": bool(claims),
+                "claims": claims.get("claims"),
+                "abr_size": claims.get("size"),
+                "abr_sha256": claims.get("sha256"),
+            }
+        )
+
+    manifest = pd.DataFrame(
+        events,
+        columns=["prefix", "date", "source", "name", "players", "rounds", "size", "sha256",
+                 "has_abr", "claims", "abr_size", "abr_sha256"],
+    )
+    manifest["date"] = pd.to_datetime(manifest["date"])
+    return manifest.sort_values(["date", "prefix"]).reset_index(drop=True)
+
+# get_meta loads a meta by name from metas_dir, or from a path to a JSON file.
+def get_meta(name, metas_dir="metas"):
+    path = name if name.endswith(".json") else os.path.join(metas_dir, f"{name}.json")
+    assert os.path.exists(path), f"unknown meta {name}"
+    meta = get_json_from_file(path)
+    for key in ["name", "file_prefix"]:
+        assert key in meta, f"meta definition {path} is missing '{key}'"
+    assert "tournaments" in meta or "start_date" in meta, f"meta definition {path} needs tournaments or start_date"
+    return meta
+
+def get_registered_metas(metas_dir="metas"):
+    return sorted(f[: -len(".json")] for f in os.listdir(metas_dir) if f.endswith(".json"))
+
+# get_meta_tournaments returns the tournaments array for a meta definition.
+def get_meta_tournaments(meta, data_dir="data"):
+    if "tournaments" in meta:
+        return meta["tournaments"]
+
+    manifest = get_data_manifest(data_dir)
+    selected = manifest["has_abr"] & (manifest["date"] >= pd.Timestamp(meta["start_date"]))
+    if meta.get("end_date"):
+        selected &= manifest["date"] <= pd.Timestamp(meta["end_date"])
+    for pattern in meta.get("exclude", []):
+        selected &= ~manifest["prefix"].apply(lambda p: fnmatch.fnmatch(p, pattern))
+
+    return manifest.loc[selected, ["prefix", "source"]].values.tolist()
+
+
+# PipelineTrace records per-stage instrumentation for aggregate_tournament_data:
+# wall time, rows in and out, rows dropped by each flattener skip rule and peak
+# traced memory.  peak_memory is the peak above the memory in use when the stage
+# started, so frames kept from earlier events don't count against it;
+# peak_memory_total is the absolute peak.  Pass an instance as the trace argument to enable it; with the
+# default of None the pipeline runs uninstrumented.  Memory tracing uses
+# tracemalloc, which slows the pipeline noticeably, so it can be turned off with
+# memory=False.
+#
+# trace = ep.PipelineTrace()
+# flattened_matches, paired_matches = ep.aggregate_tournament_data(id_df, tournaments, trace=trace)
+# trace.to_dataframe()
+class PipelineTrace:
+    skip_rules = ["bye", "unplayed", "zero_score_draw"]
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.records = []
+        self._started_tracemalloc = False
+
+    def begin(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def end(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # stage times the body of a with block and appends a record for it.  The
+    # yielded dict can be updated with rows_out and skip counts before the
+    # block exits.
+    @contextmanager
+    def stage(self, event, stage, rows_in=None):
+        record = {"event": event, "stage": stage, "rows_in": rows_in, "rows_out": None}
+        for rule in self.skip_rules:
+            record[f"skipped_{rule}"] = 0
+        tracing = self.memory and tracemalloc.is_tracing()
+        record["start_memory"] = None
+        if tracing:
+            tracemalloc.reset_peak()
+            record["start_memory"] = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            record["peak_memory_total"] = tracemalloc.get_traced_memory()[1] if tracing else None
+            record["peak_memory"] = (
+                record["peak_memory_total"] - record["start_memory"] if tracing else None
+            )
+            self.records.append(record)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            self.records,
+            columns=["event", "stage", "seconds", "rows_in", "rows_out"]
+            + [f"skipped_{rule}" for rule in self.skip_rules]
+            + ["peak_memory", "peak_memory_total", "start_memory"],
+        )
+
+    # event_summary totals time and skips per event.  An event's peak memory is
+    # its largest absolute stage peak less the memory in use when its first
+    # stage started, so it includes frames its own earlier stages still hold.
+    def event_summary(self) -> pd.DataFrame:
+        df = self.to_dataframe()
+        agg = {"seconds": "sum", "peak_memory_total": "max", "start_memory": "first"}
+        for rule in self.skip_rules:
+            agg[f"skipped_{rule}"] = "sum"
+        summary = df.groupby("event", sort=False).agg(agg).reset_index()
+        summary.insert(2, "peak_memory", summary["peak_memory_total"] - summary["start_memory"])
+        return summary.drop(columns=["peak_memory_total", "start_memory"])
+
+    def to_json(self, file_path=None):
+        trace = json.dumps(self.records, indent=2)
+        if file_path is not None:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(trace)
+        return trace
+
+
 # aggregate_tournament_data takes a dataframe with the output of
 # get_id_data_from_file and an array of tournaments.  It returns dataframes
 # with flattened match records and paired match records over the entire set.
@@ -148,44 +355,108 @@ def get_tournament_players(id_df, raw_data, abr_claims_data):
 # data.
 #
 # ["2024-01-06-online-new-years-co", "aesops"]
-def aggregate_tournament_data(id_df, tournaments) -> (pd.DataFrame, pd.DataFrame):
-    gamedata_for_event = {}
-    abr_for_event = {}
-    players_for_event = {}
-    flattened_matches_for_event = {}
-    paired_matches_for_event = {}
-
-    # extract data for each tournament
-    for tt in tournaments:
-        t, s = tt
-        assert s == "cobra" or s == "aesops", f"unsupported source {source} for {t}"
-
-        gamedata_for_event[t] = get_json_from_file(f"data/{t}-{s}.json")
-        abr_for_event[t] = get_json_from_file(f"data/{t}-abr.json")
-        p = get_tournament_players(id_df, gamedata_for_event[t], abr_for_event[t])
-        players_for_event[t] = p
-        flattened_matches_for_event[t] = get_flattened_match_records(
-            s, gamedata_for_event[t], p
-        )
-        paired_matches_for_event[t] = get_paired_match_records(flattened_matches_for_event[t])
-
-    # aggregate over all tournaments
-    t0_name = tournaments[0][0]
-    agg_flattened_matches = new_dataframe_from_dataframe(flattened_matches_for_event[t0_name])
-    agg_paired_matches = new_dataframe_from_dataframe(paired_matches_for_event[t0_name])
-    for tt in tournaments:
-        t = tt[0]
-        agg_flattened_matches = pd.concat([agg_flattened_matches, flattened_matches_for_event[t]], ignore_index=True)
-        agg_paired_matches = pd.concat(
-            [agg_paired_matches, paired_matches_for_event[t]], ignore_index=True
-        )
+#
+# tournaments may also be the name of a meta in metas/, e.g. "rwr-2024-05",
+# which is resolved with get_meta_tournaments.
+#
+# data_dir is the directory holding the event files; it defaults to 'data' and
+# exists so synthetic corpora can be loaded from elsewhere.
+#
+# trace is an optional PipelineTrace to record per-stage instrumentation.
+def aggregate_tournament_data(id_df, tournaments, data_dir="data", trace=None) -> (pd.DataFrame, pd.DataFrame):
+    if isinstance(tournaments, str):
+        tournaments = get_meta_tournaments(get_meta(tournaments), data_dir)
+
+    stage = untraced_stage if trace is None else trace.stage
+    if trace is not None:
+        trace.begin()
+    try:
+        flattened_matches_for_event = {}
+        paired_matches_for_event = {}
+
+        # extract data for each tournament
+        for tt in tournaments:
+            t, s = tt
+            flattened_matches_for_event[t], paired_matches_for_event[t] = get_event_frames(
+                id_df, data_dir, t, s, stage
+            )
+
+        # aggregate over all tournaments
+        rows_in = sum(len(df) for df in flattened_matches_for_event.values())
+        with stage("*", "aggregate_concat", rows_in) as rec:
+            agg_flattened_matches, agg_paired_matches = concat_event_frames(
+                [flattened_matches_for_event[tt[0]] for tt in tournaments],
+                [paired_matches_for_event[tt[0]] for tt in tournaments],
+            )
+            rec["rows_out"] = len(agg_flattened_matches)
+    finally:
+        if trace is not None:
+            trace.end()
+
+    return agg_flattened_matches, agg_paired_matches
+
 
+# get_event_frames loads one event's files from data_dir and returns its
+# flattened and paired match records.  Each step runs inside
+# stage(event, name, rows_in), a PipelineTrace.stage or anything with the same
+# signature, such as untraced_stage.
+def get_event_frames(id_df, data_dir, t, s, stage=None) -> (pd.DataFrame, pd.DataFrame):
+    assert s == "cobra" or s == "aesops", f"unsupported source {s} for {t}"
+    if stage is None:
+        stage = untraced_stage
+
+    with stage(t, "load_json") as rec:
+        gamedata = get_json_from_file(f"{data_dir}/{t}-{s}.json")
+        abr = get_json_from_file(f"{data_dir}/{t}-abr.json")
+        tables = sum(len(tables) for tables in gamedata["rounds"])
+        rec["rows_out"] = tables
+
+    with stage(t, "get_tournament_players", len(gamedata["players"])) as rec:
+        p = get_tournament_players(id_df, gamedata, abr)
+        rec["rows_out"] = len(p)
+
+    with stage(t, f"get_flattened_match_records_{s}", tables) as rec:
+        skipped = {}
+        flattened = get_flattened_match_records(s, gamedata, p, skipped)
+        rec["rows_out"] = len(flattened)
+        for rule, count in skipped.items():
+            rec[f"skipped_{rule}"] = count
+
+    with stage(t, "get_paired_match_records", len(flattened)) as rec:
+        paired = get_paired_match_records(flattened)
+        rec["rows_out"] = len(paired)
+
+    return flattened, paired
+
+
+# untraced_stage stands in for PipelineTrace.stage when aggregate_tournament_data
+# runs without a trace; the record it yields is discarded.
+@contextmanager
+def untraced_stage(event, stage, rows_in=None):
+    yield {}
+
+
+# concat_event_frames concatenates per-event flattened and paired frames, in
+# order, into the frames aggregate_tournament_data returns.  The frames are
+# concatenated in one call rather than appended one at a time, which copies
+# the growing result for every event.
+def concat_event_frames(flattened_frames, paired_frames) -> (pd.DataFrame, pd.DataFrame):
+    agg_flattened_matches = pd.concat(
+        [new_dataframe_from_dataframe(flattened_frames[0])] + list(flattened_frames), ignore_index=True
+    )
+    agg_paired_matches = pd.concat(
+        [new_dataframe_from_dataframe(paired_frames[0])] + list(paired_frames), ignore_index=True
+    )
     return agg_flattened_matches, agg_paired_matches
 
+
 # in this context, a "match" represents a single player's record in a match. player_fraction
 # is the fraction of the swiss ranks that are valid for including player pairings.  The default
 # is 1.0 to include all ranks, but zero is also special cased to do the same.
-def get_flattened_match_records(source, raw_data, players):
+#
+# If skipped is a dict, it is updated with the number of tables dropped by each
+# skip rule: "bye", "unplayed" and "zero_score_draw".
+def get_flattened_match_records(source, raw_data, players, skipped=None):
     assert source == "cobra" or source == "aesops", f"unsupported source {source}"
     template = {
         "event": "str",
@@ -206,11 +477,15 @@ def get_flattened_match_records(source, raw_data, players):
         "corpPlay": "int",
     }
     if source == "cobra":
-        return get_flattened_match_records_cobra(raw_data, players, template)
+        return get_flattened_match_records_cobra(raw_data, players, template, skipped)
 
-    return get_flattened_match_records_aesops(raw_data, players, template)
+    return get_flattened_match_records_aesops(raw_data, players, template, skipped)
 
-def get_flattened_match_records_cobra(raw_data, players, template):
+def count_skipped(skipped, rule):
+    if skipped is not None:
+        skipped[rule] = skipped.get(rule, 0) + 1
+
+def get_flattened_match_records_cobra(raw_data, players, template, skipped=None):
     event_name = raw_data["name"]
     event_date = pd.to_datetime(raw_data["date"])
 
@@ -220,6 +495,7 @@ def get_flattened_match_records_cobra(raw_data, players, template):
         for table_number, table in enumerate(tables):
             # skip byes
             if table["player1"]["id"] is None or table["player2"]["id"] is None:
+                count_skipped(skipped, "bye")
                 continue
 
             # skip matches with no data; maybe this round/match was not actually playede
@@ -229,7 +505,8 @@ def get_flattened_match_records_cobra(raw_data, players, template):
                 or table["player2"]["runnerScore"] is None
                 or table["player2"]["corpScore"] is None
             ):
-                continue 
+                count_skipped(skipped, "unplayed")
+                continue
 
             # skip swiss matches with no player or corp score; these draws have no runner/corp win info
             if not table["eliminationGame"] and (
@@ -239,6 +516,7 @@ def get_flattened_match_records_cobra(raw_data, players, template):
                 + table["player2"]["corpScore"]
                 == 0
             ):
+                count_skipped(skipped, "zero_score_draw")
                 continue
 
             for player in ["player1", "player2"]:
@@ -255,7 +533,7 @@ def get_flattened_match_records_cobra(raw_data, players, template):
 
     return augment_player_records(records, players)
 
-def get_flattened_match_records_aesops(raw_data, players, template):
+def get_flattened_match_records_aesops(raw_data, players, template, skipped=None):
     event_name = raw_data["name"]
     event_date = pd.to_datetime(raw_data["date"])
 
@@ -265,10 +543,15 @@ def get_flattened_match_records_aesops(raw_data, players, template):
         for table_number, table in enumerate(tables):
             # skip byes
             if table["runnerPlayer"] == "(BYE)" or table["corpPlayer"] == "(BYE)":
+                count_skipped(skipped, "bye")
                 continue
 
             # skip swiss matches with no player or corp score; these draws have no runner/corp win info
-            if not table.get("eliminationGame") and ( table["runnerScore"] + table["corpScore"] == 0):
+            # Aesops reports scores as strings
+            if not table.get("eliminationGame") and (
+                int(table["runnerScore"]) + int(table["corpScore"]) == 0
+            ):
+                count_skipped(skipped, "zero_score_draw")
                 continue
 
             corp_row = {}
@@ -494,6 +777,15 @@ def get_corp_win_rate_by_event_month(flattened) -> pd.DataFrame:
     return corp_win_by_event_month
 
 
+# side_keys returns the flattened match columns that group a side ("corp" or
+# "runner") by identity or by faction.
+def side_keys(side, by):
+    assert by == "identity" or by == "faction", f"unsupported grouping {by}"
+    if by == "identity":
+        return [f"{side}Identity", f"{side}Faction"]
+    return [f"{side}Faction"]
+
+
 def get_paired_match_records(flattened_event_records) -> pd.DataFrame:
     paired = pd.merge(
         flattened_event_records,
@@ -670,14 +962,17 @@ def get_corp_popularity_by_month(flattened_matches):
     )
     return corp_popularity_by_month_pct
 
-def plot_corp_popularity_two_up(df, title, left_faction, right_faction, ymax=0.3):
+# The plot_*_popularity_* functions plot "pct" against "YM" by default; pass x
+# and y to plot other series with the same shape, such as the output of
+# get_corp_popularity_rolling with x="window_end".
+def plot_corp_popularity_two_up(df, title, left_faction, right_faction, ymax=0.3, x="YM", y="pct"):
     fig, axs = plt.subplots(1, 2, figsize=(10, 6))
     sns.lineplot(
         data=df[
             df["corpFaction"] == left_faction
         ],
-        x="YM",
-        y="pct",
+        x=x,
+        y=y,
         hue="corpIdentity",
         ax=axs[0],
     )
@@ -685,8 +980,8 @@ def plot_corp_popularity_two_up(df, title, left_faction, right_faction, ymax=0.3
         data=df[
             df["corpFaction"] == right_faction
         ],
-        x="YM",
-        y="pct",
+        x=x,
+        y=y,
         hue="corpIdentity",
         ax=axs[1],
     )
@@ -731,14 +1026,14 @@ def get_runner_popularity_by_month(flattened_matches):
     )
     return runner_popularity_by_month_pct
 
-def plot_runner_popularity_two_up(df, title, left_faction, right_faction, ymax=0.4):
+def plot_runner_popularity_two_up(df, title, left_faction, right_faction, ymax=0.4, x="YM", y="pct"):
     fig, axs = plt.subplots(1, 2, figsize=(10, 6))
     sns.lineplot(
         data=df[
             df["runnerFaction"] == left_faction
         ],
-        x="YM",
-        y="pct",
+        x=x,
+        y=y,
         hue="runnerIdentity",
         ax=axs[0],
     )
@@ -749,8 +1044,8 @@ def plot_runner_popularity_two_up(df, title, left_faction, right_faction, ymax=0
             data=df[
                 df["runnerFaction"] == right_faction
             ],
-            x="YM",
-            y="pct",
+            x=x,
+            y=y,
             hue="runnerIdentity",
             ax=axs[1],
         )
@@ -759,14 +1054,14 @@ def plot_runner_popularity_two_up(df, title, left_faction, right_faction, ymax=0
     fig.suptitle(title, fontsize=14)
     plt.tight_layout()  # Adjust the layout to make room for the suptitle
 
-def plot_runner_popularity_one_up(df, title, left_faction, ymax=0.3):
+def plot_runner_popularity_one_up(df, title, left_faction, ymax=0.3, x="YM", y="pct"):
     fig, axs = plt.subplots(1, 1, figsize=(10, 6))
     sns.lineplot(
         data=df[
             df["runnerFaction"] == left_faction
         ],
-        x="YM",
-        y="pct",
+        x=x,
+        y=y,
         hue="runnerIdentity",
         ax=axs,
     )
@@ -775,6 +1070,86 @@ def plot_runner_popularity_one_up(df, title, left_faction, ymax=0.3):
     fig.suptitle(title, fontsize=16)
     plt.tight_layout()  # Adjust the layout to make room for the suptitle
 
+# Rolling-window trends
+#
+# The get_*_rolling functions compute popularity and win rate series over a
+# trailing window (default 28 days) evaluated every step (default 1 day),
+# instead of the calendar month buckets of the *_by_month functions.
+#
+# Match records are first reduced to per-day contributions for each identity,
+# laid out on a dense day x identity grid.  A running sum down the day axis
+# means each window total is the difference of two running sums, so sliding
+# the window adds the contributions of the day entering it and subtracts the
+# day leaving it, without regrouping the frame for every window.
+#
+# by is "identity" for per-identity series or "faction" for per-faction series.
+# Window rows with no matches for a key are dropped, as they would be absent
+# from a groupby.
+
+def get_rolling_sums(df, keys, values, window="28D", step="1D") -> pd.DataFrame:
+    window_days = pd.Timedelta(window).days
+    step_days = pd.Timedelta(step).days
+    assert window_days >= 1 and step_days >= 1, f"window {window} and step {step} must be whole days"
+
+    days = df["date"].dt.normalize()
+    daily = df[keys + values].assign(window_end=days).groupby(["window_end"] + keys).sum()
+    grid = pd.date_range(days.min(), days.max(), freq="D")
+    wide = daily.unstack(keys, fill_value=0).reindex(grid, fill_value=0)
+
+    running = np.zeros((len(grid) + 1, wide.shape[1]), dtype=np.int64)
+    np.cumsum(wide.to_numpy(dtype=np.int64), axis=0, out=running[1:])
+    ends = np.arange(len(grid) - 1, -1, -step_days)[::-1]
+    starts = np.maximum(ends + 1 - window_days, 0)
+    totals = running[ends + 1] - running[starts]
+
+    # columns are value-major, so each value's block has the same key order
+    key_index = wide.columns.droplevel(0)[: wide.shape[1] // len(values)]
+    totals = totals.reshape(len(ends), len(values), len(key_index))
+    window_idx, key_idx = np.nonzero(totals.sum(axis=1) > 0)
+
+    result = key_index[key_idx].to_frame(index=False)
+    result.insert(0, "window_end", grid[ends][window_idx])
+    for i, value in enumerate(values):
+        result[value] = totals[window_idx, i, key_idx]
+    return result
+
+
+def get_popularity_rolling(flattened_matches, side, window="28D", step="1D", by="identity") -> pd.DataFrame:
+    keys = side_keys(side, by)
+    df = flattened_matches.dropna(subset=keys).assign(size=1)
+    result = get_rolling_sums(df, keys, ["size"], window, step)
+    result["total_in_window"] = result.groupby("window_end")["size"].transform("sum")
+    result["pct"] = result["size"] / result["total_in_window"]
+    return result
+
+
+def get_win_rate_rolling(flattened_matches, side, window="28D", step="1D", by="identity") -> pd.DataFrame:
+    keys = side_keys(side, by)
+    df = flattened_matches.dropna(subset=keys)
+    result = get_rolling_sums(df, keys, [f"{side}Win", f"{side}Play"], window, step).rename(
+        columns={f"{side}Win": "total_wins", f"{side}Play": "matches_played"}
+    )
+    result = result[result["matches_played"] > 0].reset_index(drop=True)
+    result["win_ratio"] = result["total_wins"].astype(float) / result["matches_played"].astype(float)
+    return result
+
+
+def get_corp_popularity_rolling(flattened_matches, window="28D", step="1D", by="identity") -> pd.DataFrame:
+    return get_popularity_rolling(flattened_matches, "corp", window, step, by)
+
+
+def get_runner_popularity_rolling(flattened_matches, window="28D", step="1D", by="identity") -> pd.DataFrame:
+    return get_popularity_rolling(flattened_matches, "runner", window, step, by)
+
+
+def get_corp_win_rate_rolling(flattened_matches, window="28D", step="1D", by="identity") -> pd.DataFrame:
+    return get_win_rate_rolling(flattened_matches, "corp", window, step, by)
+
+
+def get_runner_win_rate_rolling(flattened_matches, window="28D", step="1D", by="identity") -> pd.DataFrame:
+    return get_win_rate_rolling(flattened_matches, "runner", window, step, by)
+
+
 def plot_corp_win_rate_over_time(corp_win_rate_by_event_month, title, faction):
     ordered_months = sorted(corp_win_rate_by_event_month["YM"].unique())
 
@@ -842,3 +1217,82 @@ def plot_runner_win_rate_over_time(runner_win_rate_by_event_month, title, factio
     g.figure.suptitle(f"{title}: {faction}", fontsize=14)
     g.figure.subplots_adjust(top=.9)
     g.set_axis_labels("Date", "Win Ratio")  # Set common X and Y axis labels
+
+# main is the command line entry point, see ./epiphany --help.
+#
+#   ./epiphany build rwr-2024-05
+#   ./epiphany events rwr-2024-05
+#   ./epiphany serve --preload rwr-2024-05
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="epiphany")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="rebuild stale outputs for one or more metas")
+    build.add_argument("metas", nargs="+", help="meta names or definition files")
+    build.add_argument("--data-dir", default="data")
+    build.add_argument("--output-dir", default="output")
+    build.add_argument("--cards", default="data/cards/cards.json")
+    build.add_argument("-j", "--jobs", type=int, default=None, help="parallel workers (default: CPUs)")
+    build.add_argument("-B", "--force", action="store_true", help="rebuild all targets")
+    build.add_argument("-n", "--dry-run", action="store_true", help="list stale targets only")
+    build.add_argument("--no-figures", action="store_true", help="skip figure targets")
+
+    manifest = subparsers.add_parser("manifest", help="update and print the data manifest")
+    manifest.add_argument("--data-dir", default="data")
+
+    events = subparsers.add_parser("events", help="print the tournaments array for a meta")
+    events.add_argument("meta", help="meta name or definition file")
+    events.add_argument("--data-dir", default="data")
+
+    serve = subparsers.add_parser("serve", help="serve meta aggregates on localhost")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--metas-dir", default="metas")
+    serve.add_argument("--data-dir", default="data")
+    serve.add_argument("--output-dir", default="output")
+    serve.add_argument("--cards", default="data/cards/cards.json")
+    serve.add_argument("--cache-size", type=int, default=256, help="cached results to keep")
+    serve.add_argument("--preload", nargs="*", default=[], help="metas to load at startup")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        import epiphany_build
+
+        for meta_file in args.metas:
+            epiphany_build.build_meta(
+                meta_file,
+                data_dir=args.data_dir,
+                output_dir=args.output_dir,
+                cards_file=args.cards,
+                figures=not args.no_figures,
+                jobs=args.jobs,
+                force=args.force,
+                dry_run=args.dry_run,
+            )
+
+    if args.command == "manifest":
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(get_data_manifest(args.data_dir).drop(columns=["sha256", "abr_sha256"]))
+
+    if args.command == "events":
+        for t in get_meta_tournaments(get_meta(args.meta), args.data_dir):
+            print(f"{json.dumps(t)},")
+
+    if args.command == "serve":
+        import epiphany_service
+
+        epiphany_service.serve(
+            host=args.host,
+            port=args.port,
+            metas_dir=args.metas_dir,
+            data_dir=args.data_dir,
+            output_dir=args.output_dir,
+            cards_file=args.cards,
+            cache_size=args.cache_size,
+            preload=args.preload,
+        )
+
+    return 0
@@ -0,0 +1,385 @@
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+import epiphany as ep
+
+# Make-style builds of meta reports
+#
+# A meta definition is a JSON file in metas/ with the meta name used in
+# titles, the prefix used for output filenames and either the tournaments
+# array passed to aggregate_tournament_data or a date range; see get_meta in
+# epiphany.
+#
+# get_meta_targets turns a meta into a graph of targets: per-event flattened
+# and paired frames, the aggregated meta frames and their CSV/Parquet exports,
+# the get_* aggregate tables and the notebook figures.  run_build rebuilds only
+# targets whose inputs changed since the last build, running independent
+# targets in parallel worker processes.
+
+code_files = [ep.__file__, __file__]
+
+meta_figures = {
+    "heatmap": {"kind": "heatmap", "min_games": 2},
+    "corp-popularity-hb-nbn": {"kind": "corp_popularity", "factions": [ep.hb, ep.nbn]},
+    "corp-popularity-jinteki-weyland": {
+        "kind": "corp_popularity",
+        "factions": [ep.jinteki, ep.weyland],
+    },
+    "runner-popularity-anarch-criminal": {
+        "kind": "runner_popularity",
+        "factions": [ep.anarch, ep.criminal],
+    },
+    "runner-popularity-shaper": {"kind": "runner_popularity", "factions": [ep.shaper, ""]},
+    "corp-win-rates-hb": {"kind": "corp_win_rate", "faction": ep.hb},
+    "corp-win-rates-nbn": {"kind": "corp_win_rate", "faction": ep.nbn},
+    "corp-win-rates-jinteki": {"kind": "corp_win_rate", "faction": ep.jinteki},
+    "corp-win-rates-weyland": {"kind": "corp_win_rate", "faction": ep.weyland},
+    "runner-win-rates-anarch": {"kind": "runner_win_rate", "faction": ep.anarch},
+    "runner-win-rates-criminal": {"kind": "runner_win_rate", "faction": ep.criminal},
+    "runner-win-rates-shaper": {"kind": "runner_win_rate", "faction": ep.shaper},
+}
+
+meta_tables = {
+    "runner-win-rate": ("flattened", "get_runner_win_rate"),
+    "corp-win-rate": ("flattened", "get_corp_win_rate"),
+    "runner-win-rate-by-event-month": ("flattened", "get_runner_win_rate_by_event_month"),
+    "corp-win-rate-by-event-month": ("flattened", "get_corp_win_rate_by_event_month"),
+    "corp-popularity-by-month": ("flattened", "get_corp_popularity_by_month"),
+    "runner-popularity-by-month": ("flattened", "get_runner_popularity_by_month"),
+    "grouped-player-results": ("flattened", "get_grouped_player_results"),
+    "paired-winrate": ("paired", "get_paired_winrate"),
+}
+
+
+class Target:
+    def __init__(self, name, recipe, params, inputs, outputs):
+        self.name = name
+        self.recipe = recipe
+        self.params = params
+        self.inputs = inputs
+        self.outputs = outputs
+
+
+# get_meta_from_file loads a meta by name or path and resolves its tournaments
+# array against the data manifest.
+def get_meta_from_file(file_path, data_dir="data"):
+    meta = ep.get_meta(file_path)
+    return dict(meta, tournaments=ep.get_meta_tournaments(meta, data_dir))
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# get_meta_targets returns the list of targets needed to build a meta.  Inputs
+# that are another target's output become dependencies of that target.
+def get_meta_targets(
+    meta,
+    data_dir="data",
+    output_dir="output",
+    cards_file="data/cards/cards.json",
+    figures=True,
+    parquet=None,
+):
+    if parquet is None:
+        parquet = parquet_available()
+    cache_dir = os.path.join(output_dir, "cache")
+    prefix = meta["file_prefix"]
+    targets = []
+
+    event_outputs = []
+    for t, s in meta["tournaments"]:
+        assert s == "cobra" or s == "aesops", f"unsupported source {s} for {t}"
+        outputs = [
+            os.path.join(cache_dir, f"{t}-flattened.pkl"),
+            os.path.join(cache_dir, f"{t}-paired.pkl"),
+        ]
+        targets.append(
+            Target(
+                f"event:{t}",
+                build_event,
+                {"event": t, "source": s, "data_dir": data_dir, "cards_file": cards_file},
+                [f"{data_dir}/{t}-{s}.json", f"{data_dir}/{t}-abr.json", cards_file],
+                outputs,
+            )
+        )
+        event_outputs.append(outputs)
+
+    flattened_pkl = os.path.join(cache_dir, f"{prefix}-flattened.pkl")
+    paired_pkl = os.path.join(cache_dir, f"{prefix}-paired.pkl")
+    exports = [
+        os.path.join(output_dir, f"{prefix}-flattened-matches.csv"),
+        os.path.join(output_dir, f"{prefix}-paired-matches.csv"),
+    ]
+    if parquet:
+        exports += [
+            os.path.join(output_dir, f"{prefix}-flattened-matches.parquet"),
+            os.path.join(output_dir, f"{prefix}-paired-matches.parquet"),
+        ]
+    targets.append(
+        Target(
+            f"matches:{prefix}",
+            build_matches,
+            {"parquet": parquet},
+            [f for outputs in event_outputs for f in outputs],
+            [flattened_pkl, paired_pkl] + exports,
+        )
+    )
+
+    frames = {"flattened": flattened_pkl, "paired": paired_pkl}
+    for table, (frame, function) in meta_tables.items():
+        targets.append(
+            Target(
+                f"table:{prefix}-{table}",
+                build_table,
+                {"function": function},
+                [frames[frame]],
+                [os.path.join(output_dir, f"{prefix}-{table}.csv")],
+            )
+        )
+
+    if figures:
+        for figure, params in meta_figures.items():
+            targets.append(
+                Target(
+                    f"figure:{prefix}-{figure}",
+                    build_figure,
+                    dict(params, meta=meta["name"]),
+                    [flattened_pkl, paired_pkl],
+                    [os.path.join(output_dir, f"{prefix}-{figure}.png")],
+                )
+            )
+
+    return targets
+
+
+# Recipes run in worker processes, so they take only picklable arguments and
+# read their inputs from disk.
+
+id_df_for_cards_file = {}
+
+
+def get_cached_id_data(cards_file):
+    if cards_file not in id_df_for_cards_file:
+        id_df_for_cards_file[cards_file] = ep.get_id_data_from_file(cards_file)
+    return id_df_for_cards_file[cards_file]
+
+
+def build_event(params, inputs, outputs):
+    flattened, paired = ep.get_event_frames(
+        get_cached_id_data(params["cards_file"]),
+        params["data_dir"],
+        params["event"],
+        params["source"],
+    )
+    flattened.to_pickle(outputs[0])
+    paired.to_pickle(outputs[1])
+
+
+def build_matches(params, inputs, outputs):
+    flattened, paired = ep.concat_event_frames(
+        [pd.read_pickle(f) for f in inputs[0::2]], [pd.read_pickle(f) for f in inputs[1::2]]
+    )
+    flattened.to_pickle(outputs[0])
+    paired.to_pickle(outputs[1])
+    flattened.to_csv(outputs[2])
+    paired.to_csv(outputs[3])
+    if params["parquet"]:
+        flattened.to_parquet(outputs[4])
+        paired.to_parquet(outputs[5])
+
+
+def build_table(params, inputs, outputs):
+    df = pd.read_pickle(inputs[0])
+    getattr(ep, params["function"])(df).to_csv(outputs[0])
+
+
+def build_figure(params, inputs, outputs):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    flattened = pd.read_pickle(inputs[0])
+    paired = pd.read_pickle(inputs[1])
+    meta = params["meta"]
+    kind = params["kind"]
+
+    if kind == "heatmap":
+        plt.figure(figsize=(12, 10))
+        ep.get_heatmap(meta, ep.get_paired_winrate(paired), params["min_games"])
+    elif kind == "corp_popularity":
+        ep.plot_corp_popularity_two_up(
+            ep.get_corp_popularity_by_month(flattened),
+            f"{meta} - Deck popularity",
+            *params["factions"],
+        )
+    elif kind == "runner_popularity":
+        ep.plot_runner_popularity_two_up(
+            ep.get_runner_popularity_by_month(flattened),
+            f"{meta} - Deck popularity",
+            *params["factions"],
+        )
+    elif kind == "corp_win_rate":
+        df = ep.get_corp_win_rate_by_event_month(flattened)
+        if (df["corpFaction"] == params["faction"]).any():
+            ep.plot_corp_win_rate_over_time(df, f"{meta} - Deck win rates by ID", params["faction"])
+        else:
+            plt.figure()
+    elif kind == "runner_win_rate":
+        df = ep.get_runner_win_rate_by_event_month(flattened)
+        if (df["runnerFaction"] == params["faction"]).any():
+            ep.plot_runner_win_rate_over_time(
+                df, f"{meta} - Deck win rates by ID", params["faction"]
+            )
+        else:
+            plt.figure()
+    else:
+        assert False, f"unknown figure kind {kind}"
+
+    plt.savefig(outputs[0], bbox_inches="tight")
+    plt.close("all")
+
+
+def run_target(recipe, params, inputs, outputs):
+    for f in outputs:
+        os.makedirs(os.path.dirname(f) or ".", exist_ok=True)
+    recipe(params, inputs, outputs)
+
+
+# file_hash returns the sha256 of a file, reusing the hash in cache if the
+# file's mtime and size are unchanged.
+def file_hash(path, cache):
+    st = os.stat(path)
+    cached = cache.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    cache[path] = [st.st_mtime_ns, st.st_size, h.hexdigest()]
+    return cache[path][2]
+
+
+def target_signature(target, hash_cache):
+    h = hashlib.sha256()
+    h.update(target.recipe.__name__.encode())
+    h.update(json.dumps(target.params, sort_keys=True).encode())
+    for f in target.inputs + code_files:
+        h.update(f.encode())
+        h.update(file_hash(f, hash_cache).encode())
+    return h.hexdigest()
+
+
+def load_build_state(state_file):
+    if os.path.exists(state_file):
+        with open(state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"files": {}, "targets": {}}
+
+
+def save_build_state(state_file, state):
+    os.makedirs(os.path.dirname(state_file) or ".", exist_ok=True)
+    tmp = f"{state_file}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, state_file)
+
+
+# run_build brings targets up to date and returns the names of the targets it
+# rebuilt.  A target is rebuilt when an output is missing or the signature of
+# its recipe, parameters, input files and the epiphany code differs from the
+# last successful build.  Targets become ready when all the targets producing
+# their inputs are done and ready targets run concurrently on up to jobs
+# processes.  With dry_run, the stale targets are reported but not built;
+# anything downstream of a stale target is assumed stale too.
+def run_build(targets, state_file, jobs=None, force=False, dry_run=False, log=print):
+    state = load_build_state(state_file)
+    hash_cache = state["files"]
+    producer = {f: t.name for t in targets for f in t.outputs}
+    deps = {t.name: {producer[f] for f in t.inputs if f in producer} for t in targets}
+    pending = {t.name: t for t in targets}
+    done = set()
+    rebuilt = []
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in [n for n in pending if deps[n] <= done]:
+                target = pending.pop(name)
+                missing = [f for f in target.inputs if f not in producer and not os.path.exists(f)]
+                assert not missing, f"{name}: missing input {missing[0]}"
+
+                stale_upstream = dry_run and bool(deps[name] & set(rebuilt))
+                if stale_upstream:
+                    signature = None
+                else:
+                    signature = target_signature(target, hash_cache)
+                up_to_date = (
+                    not force
+                    and not stale_upstream
+                    and state["targets"].get(name) == signature
+                    and all(os.path.exists(f) for f in target.outputs)
+                )
+                if up_to_date:
+                    done.add(name)
+                elif dry_run:
+                    log(f"would build {name}")
+                    rebuilt.append(name)
+                    done.add(name)
+                else:
+                    log(f"building {name}")
+                    future = pool.submit(
+                        run_target, target.recipe, target.params, target.inputs, target.outputs
+                    )
+                    running[future] = (target, signature)
+
+            if not running:
+                ready = [n for n in pending if deps[n] <= done]
+                assert ready or not pending, f"dependency cycle among {sorted(pending)}"
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                target, signature = running.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    save_build_state(state_file, state)
+                    raise
+                state["targets"][target.name] = signature
+                rebuilt.append(target.name)
+                done.add(target.name)
+
+    if not dry_run:
+        save_build_state(state_file, state)
+    return rebuilt
+
+
+def build_meta(
+    meta_file,
+    data_dir="data",
+    output_dir="output",
+    cards_file="data/cards/cards.json",
+    figures=True,
+    jobs=None,
+    force=False,
+    dry_run=False,
+    log=print,
+):
+    meta = get_meta_from_file(meta_file, data_dir)
+    targets = get_meta_targets(meta, data_dir, output_dir, cards_file, figures)
+    state_file = os.path.join(output_dir, "cache", "build-state.json")
+    rebuilt = run_build(targets, state_file, jobs, force, dry_run, log)
+    status = "stale" if dry_run else "rebuilt"
+    log(f"{meta['name']}: {len(rebuilt)} of {len(targets)} targets {status}")
+    return rebuilt
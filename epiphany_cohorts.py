@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+import epiphany as ep
+
+# Cohorts
+#
+# A cohort is a named set of players, e.g. a team, defined in cohorts.json:
+#
+#   {"tai": ["Baa Ram Wu", "AugustusCaesar", ...]}
+#
+# CohortIndex compiles every cohort against the player columns of a flattened
+# ("name") or paired ("corp_player", "runner_player") frame once.  Each distinct
+# player gets a bitset of the cohorts they belong to and each row gets its
+# player's bitset, so a cohort's mask is one vectorized AND over the rows.
+# Masks are cached after first use.  They are numpy boolean arrays aligned with
+# the rows of the indexed frame, and combine with &, | and ~:
+#
+# cohorts = co.load_cohorts()
+# index = co.CohortIndex(paired_matches, cohorts)
+# paired_matches[index.mask("tai")]                    # a tai player on either side
+# paired_matches[index.mask("tai", "corp_player") & ~index.mask("tai", "runner_player")]
+#
+# get_cohort_win_rate and get_cohort_paired_winrate compare a cohort against the
+# rest of the field in a single groupby.
+
+player_columns = ["name", "corp_player", "runner_player"]
+field_label = "field"
+
+
+def load_cohorts(cohorts_file="cohorts.json"):
+    cohorts = ep.get_json_from_file(cohorts_file)
+    return {name: frozenset(members) for name, members in cohorts.items()}
+
+
+class CohortIndex:
+    max_cohorts = 64
+
+    def __init__(self, df, cohorts, columns=None):
+        if len(cohorts) > self.max_cohorts:
+            raise ValueError(
+                f"at most {self.max_cohorts} cohorts can be indexed, got {len(cohorts)}"
+            )
+        if columns is None:
+            columns = [c for c in player_columns if c in df.columns]
+        if not columns:
+            raise ValueError(f"no player columns to index; expected one of {player_columns}")
+        self.index = df.index
+        self.columns = columns
+        self.bits = {name: np.uint64(1) << np.uint64(i) for i, name in enumerate(cohorts)}
+        self.row_bits = {}
+        for column in columns:
+            codes, players = pd.factorize(df[column])
+            # missing players get code -1, which indexes the trailing zero
+            player_bits = np.zeros(len(players) + 1, dtype=np.uint64)
+            for name, members in cohorts.items():
+                player_bits[:-1][players.isin(members)] |= self.bits[name]
+            self.row_bits[column] = player_bits[codes]
+        self.masks = {}
+
+    # mask returns a read-only boolean array selecting the rows where the player
+    # in column belongs to cohort, or where any indexed player does when column
+    # is None.
+    def mask(self, cohort, column=None) -> np.ndarray:
+        key = (cohort, column)
+        if key in self.masks:
+            return self.masks[key]
+        if cohort not in self.bits:
+            raise KeyError(f"unknown cohort {cohort}")
+        if column is None:
+            mask = np.logical_or.reduce([self.mask(cohort, c) for c in self.columns])
+        else:
+            mask = (self.row_bits[column] & self.bits[cohort]) != 0
+        mask.flags.writeable = False
+        self.masks[key] = mask
+        return mask
+
+    # labels returns a Series naming each row's cohort, or "field" for players
+    # outside it, for use as a groupby key.
+    def labels(self, df, cohort, column, name="cohort") -> pd.Series:
+        self.check(df)
+        return pd.Series(
+            np.where(self.mask(cohort, column), cohort, field_label), index=df.index, name=name
+        )
+
+    # check raises unless df has the index the cohort index was built over.
+    # Masks are positional, so a sorted, filtered or reindexed frame needs its
+    # own CohortIndex.
+    def check(self, df):
+        if not df.index.equals(self.index):
+            raise ValueError(
+                "frame's index doesn't match the frame the cohort index was built over"
+            )
+
+
+# get_cohort_matches replaces the tai_matches row filters: matches with a cohort
+# player on the given side, or on either side when side is None.
+def get_cohort_matches(paired_matches, index, cohort, side=None) -> pd.DataFrame:
+    index.check(paired_matches)
+    column = None if side is None else f"{side}_player"
+    return paired_matches[index.mask(cohort, column)]
+
+
+# get_cohort_win_rate returns the side's win rate by identity (or faction) for
+# the cohort's players and for the rest of the field.
+def get_cohort_win_rate(
+    flattened_matches, index, cohort, side="corp", by="identity"
+) -> pd.DataFrame:
+    keys = ep.side_keys(side, by)
+    labels = index.labels(flattened_matches, cohort, "name")
+    result = (
+        flattened_matches.groupby([labels] + [flattened_matches[k] for k in keys])
+        .agg(
+            total_wins=pd.NamedAgg(column=f"{side}Win", aggfunc="sum"),
+            matches_played=pd.NamedAgg(column=f"{side}Play", aggfunc="sum"),
+        )
+        .reset_index()
+    )
+    result = result[result["matches_played"] > 0].reset_index(drop=True)
+    result["win_ratio"] = result["total_wins"].astype(float) / result["matches_played"].astype(
+        float
+    )
+    return result.sort_values(by=["cohort", "win_ratio"], ascending=[True, False]).reset_index(
+        drop=True
+    )
+
+
+def get_corp_cohort_win_rate(flattened_matches, index, cohort, by="identity") -> pd.DataFrame:
+    return get_cohort_win_rate(flattened_matches, index, cohort, "corp", by)
+
+
+def get_runner_cohort_win_rate(flattened_matches, index, cohort, by="identity") -> pd.DataFrame:
+    return get_cohort_win_rate(flattened_matches, index, cohort, "runner", by)
+
+
+# get_cohort_paired_winrate returns corp win ratios for every pairing of cohort
+# and field on each side (cohort vs cohort, cohort vs field, field vs cohort and
+# field vs field), per corp and runner identity unless identities is False.
+def get_cohort_paired_winrate(paired_matches, index, cohort, identities=True) -> pd.DataFrame:
+    keys = [
+        index.labels(paired_matches, cohort, "corp_player", "corp_cohort"),
+        index.labels(paired_matches, cohort, "runner_player", "runner_cohort"),
+    ]
+    if identities:
+        keys += [paired_matches["corp"], paired_matches["runner"]]
+    result = (
+        paired_matches.groupby(keys)
+        .agg(
+            corp_wins=pd.NamedAgg(column="corp_wins", aggfunc="sum"),
+            games_played=pd.NamedAgg(column="corp_wins", aggfunc="count"),
+        )
+        .reset_index()
+    )
+    result["corp_win_ratio"] = result["corp_wins"] / result["games_played"]
+    return result
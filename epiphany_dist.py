@@ -0,0 +1,178 @@
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+# Win ratio distributions
+#
+# get_win_ratio_kde replaces per-facet seaborn kdeplot fits.  Every group (by
+# default identity x YM) is linearly binned onto one shared grid over [0, 1]
+# and all groups are smoothed together with a single batched FFT convolution.
+# Win ratios are bounded, so the data is reflected about 0 and 1 before
+# smoothing.  Otherwise mass near 0% and 100% would leak off the ends.  The
+# bandwidth follows scipy/seaborn: Scott's factor n^(-1/5) times the group's
+# standard deviation times bw_adjust.  As with kdeplot(warn_singular=False),
+# groups with fewer than two distinct values get no curve.
+#
+# Results are cached on the contents of the input columns and the parameters,
+# so redrawing a figure doesn't recompute its curves.  Each call returns its own
+# copy of the cached frame.
+#
+# kde = dist.get_win_ratio_kde(runner_win_rate_by_event_month)
+# dist.plot_win_ratio_kde(kde)
+
+kde_cache = OrderedDict()
+kde_cache_size = 32
+
+
+def frame_key(df, columns):
+    return int(pd.util.hash_pandas_object(df[columns], index=False).sum()), len(df)
+
+
+# factorize_groups returns a group code per row and a frame of the distinct
+# groups, in order of first appearance.
+def factorize_groups(data, group_columns):
+    codes, groups = pd.MultiIndex.from_frame(data[group_columns]).factorize()
+    groups = groups.to_frame(index=False)
+    groups.columns = group_columns
+    return codes, groups
+
+
+def side_columns(df):
+    side = "runner" if "runnerIdentity" in df.columns else "corp"
+    return [f"{side}Identity", "YM"]
+
+
+def get_win_ratio_kde(
+    df, group_columns=None, value="win_ratio", grid_size=256, bw_adjust=0.8, cache=True
+) -> pd.DataFrame:
+    if group_columns is None:
+        group_columns = side_columns(df)
+    key = (
+        frame_key(df, group_columns + [value]),
+        tuple(group_columns),
+        value,
+        grid_size,
+        bw_adjust,
+    )
+    if cache and key in kde_cache:
+        kde_cache.move_to_end(key)
+        return kde_cache[key].copy()
+
+    data = df.dropna(subset=group_columns + [value])
+    codes, groups = factorize_groups(data, group_columns)
+    x = np.clip(data[value].to_numpy(dtype=float), 0.0, 1.0)
+    n_groups = len(groups)
+    m = grid_size
+    step = 1.0 / (m - 1)
+
+    # per-group sample size and Scott bandwidth
+    n = np.bincount(codes, minlength=n_groups).astype(float)
+    sums = np.bincount(codes, weights=x, minlength=n_groups)
+    sq_sums = np.bincount(codes, weights=x * x, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = (sq_sums - sums * sums / n) / (n - 1)
+    valid = (n >= 2) & (var > 1e-12)
+    bw = np.where(valid, np.sqrt(np.where(valid, var, 1.0)) * n ** (-1 / 5) * bw_adjust, 1.0)
+
+    # linear binning: each value splits its weight between its two grid points
+    pos = x / step
+    lo = np.minimum(pos.astype(int), m - 2)
+    frac = pos - lo
+    counts = np.bincount(codes * m + lo, weights=1 - frac, minlength=n_groups * m)
+    counts += np.bincount(codes * m + lo + 1, weights=frac, minlength=n_groups * m)
+    counts = counts.reshape(n_groups, m)
+
+    # reflect about 0 and 1, giving a grid over [-1, 2].  The end points are
+    # their own reflections, so their weight is counted twice.
+    center = counts.copy()
+    center[:, [0, -1]] *= 2
+    extended = np.concatenate([counts[:, :0:-1], center, counts[:, -2::-1]], axis=1)
+    size = 4 * m
+    offsets = np.arange(size)
+    offsets = np.where(offsets < size // 2, offsets, offsets - size) * step
+    # every reflected sample is within 2 of every point in [0, 1], so kernels
+    # reach that far; the FFT size leaves room for it without the circular
+    # convolution wrapping back into [0, 1]
+    kernels = np.exp(-0.5 * (offsets[None, :] / bw[:, None]) ** 2) * (np.abs(offsets) <= 2.0)
+    kernels /= np.sqrt(2 * np.pi) * bw[:, None]
+
+    smoothed = np.fft.irfft(
+        np.fft.rfft(extended, size, axis=1) * np.fft.rfft(kernels, axis=1), size, axis=1
+    )
+    density = smoothed[:, m - 1 : 2 * m - 1] / n[:, None]
+
+    grid = np.linspace(0.0, 1.0, m)
+    keep = np.flatnonzero(valid)
+    result = groups.loc[np.repeat(keep, m)].reset_index(drop=True)
+    result[value] = np.tile(grid, len(keep))
+    result["density"] = np.maximum(density[keep].ravel(), 0.0)
+
+    if cache:
+        kde_cache[key] = result
+        while len(kde_cache) > kde_cache_size:
+            kde_cache.popitem(last=False)
+        # callers get a copy so editing it can't change later cache hits
+        return result.copy()
+    return result
+
+
+# plot_win_ratio_kde draws precomputed curves in the layout of the notebooks'
+# FacetGrid/kdeplot cells: one facet per identity, one line per month.
+def plot_win_ratio_kde(kde, col=None, hue="YM", value="win_ratio", col_wrap=4):
+    if col is None:
+        col = [c for c in kde.columns if c.endswith("Identity")][0]
+    g = sns.FacetGrid(kde, col=col, hue=hue, col_wrap=col_wrap, sharex=False, sharey=False)
+    g.map(plt.plot, value, "density")
+    g.add_legend()
+    g.set_axis_labels("Win Ratio", "Density")
+    g.set_titles(col_template="{col_name}")
+    return g
+
+
+# get_win_ratio_histograms returns counts of win ratios in equal width bins
+# over [0, 1] for every group, in one pass.
+def get_win_ratio_histograms(df, group_columns=None, value="win_ratio", bins=10) -> pd.DataFrame:
+    if group_columns is None:
+        group_columns = side_columns(df)
+    data = df.dropna(subset=group_columns + [value])
+    codes, groups = factorize_groups(data, group_columns)
+    x = np.clip(data[value].to_numpy(dtype=float), 0.0, 1.0)
+    idx = np.minimum((x * bins).astype(int), bins - 1)
+    counts = np.bincount(codes * bins + idx, minlength=len(groups) * bins)
+
+    result = groups.loc[np.repeat(np.arange(len(groups)), bins)].reset_index(drop=True)
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    result["bin_left"] = np.tile(edges[:-1], len(groups))
+    result["bin_right"] = np.tile(edges[1:], len(groups))
+    result["count"] = counts
+    return result
+
+
+# get_win_ratio_quantiles returns win ratio quantiles for each group, counting
+# only decks with more than min_matches matches, as the best-deck tables do.
+def get_win_ratio_quantiles(
+    df, group_columns=None, value="win_ratio", quantiles=(0.25, 0.5, 0.75, 0.9), min_matches=0
+) -> pd.DataFrame:
+    if group_columns is None:
+        group_columns = side_columns(df)[:1]
+    data = df[df["matches_played"] > min_matches]
+    result = data.groupby(group_columns)[value].quantile(list(quantiles)).unstack()
+    result.columns = [f"q{int(round(q * 100))}" for q in quantiles]
+    result["decks"] = data.groupby(group_columns).size()
+    return result.reset_index()
+
+
+# get_best_decks returns the best-deck table from the notebooks (top n decks by
+# win ratio with more than min_matches matches) with each deck's identity
+# median and 90th percentile win ratio alongside for comparison.
+def get_best_decks(win_rate_by_event_month, min_matches=3, n=20) -> pd.DataFrame:
+    identity = side_columns(win_rate_by_event_month)[0]
+    quantiles = get_win_ratio_quantiles(
+        win_rate_by_event_month, [identity], quantiles=(0.5, 0.9), min_matches=min_matches
+    ).rename(columns={"q50": "identity_median", "q90": "identity_q90", "decks": "identity_decks"})
+    best = win_rate_by_event_month[win_rate_by_event_month["matches_played"] > min_matches]
+    best = best.sort_values(by="win_ratio", ascending=False).head(n)
+    return pd.merge(best, quantiles, how="left", on=identity).reset_index(drop=True)
@@ -0,0 +1,422 @@
+import io
+import ipaddress
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import epiphany as ep
+import epiphany_build
+
+# Local read-only analytics service
+#
+# `./epiphany serve` loads each meta's flattened and paired frames once, using
+# the incremental build cache from `./epiphany build`, and answers requests for
+# the get_* aggregates from an LRU cache of encoded results keyed by function,
+# meta, filters and format.  Notebooks on the same machine share the loaded
+# data through Client instead of each paying the load cost.
+#
+# The service never changes the match data, but it isn't free of writes: the
+# first request for a meta runs `./epiphany build` for it (without figures),
+# which rebuilds any stale pickles, CSV and Parquet exports under output_dir.
+#
+#   GET /metas
+#   GET /stats
+#   GET /<function>?meta=rwr-2024-05[&event=...][&YM=2024-05][&player=...][&format=arrow]
+#
+# Results are JSON (pandas "table" orient) or, if pyarrow is installed, an
+# Arrow IPC stream.  The service only binds to loopback addresses and uses the
+# standard library, plus pyarrow for the optional Arrow format.
+
+default_port = 8765
+
+arrow_content_type = "application/vnd.apache.arrow.stream"
+json_content_type = "application/json"
+
+service_functions = {
+    "get_runner_win_rate": ("flattened", ep.get_runner_win_rate),
+    "get_corp_win_rate": ("flattened", ep.get_corp_win_rate),
+    "get_runner_win_rate_by_event_month": ("flattened", ep.get_runner_win_rate_by_event_month),
+    "get_corp_win_rate_by_event_month": ("flattened", ep.get_corp_win_rate_by_event_month),
+    "get_corp_popularity_by_month": ("flattened", ep.get_corp_popularity_by_month),
+    "get_runner_popularity_by_month": ("flattened", ep.get_runner_popularity_by_month),
+    "get_paired_winrate": ("paired", ep.get_paired_winrate),
+    "get_player_corp_matches": ("paired", None),
+    "get_player_runner_matches": ("paired", None),
+    "get_player_matches": ("paired", None),
+}
+
+# columns that may be used as equality filters on the source frame
+filter_columns = ["event", "YM"]
+
+
+# get_player_match_lookup returns the paired matches where any of players was
+# on the side(s) named by function.
+def get_player_match_lookup(function, paired, players):
+    assert players, f"{function} requires at least one player"
+    corp = paired["corp_player"].isin(players)
+    runner = paired["runner_player"].isin(players)
+    if function == "get_player_corp_matches":
+        mask = corp
+    elif function == "get_player_runner_matches":
+        mask = runner
+    else:
+        mask = corp | runner
+    return paired[mask].reset_index(drop=True)
+
+
+def encode_frame(df, fmt):
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue(), arrow_content_type
+    # to_json rounds floats to at most 15 significant digits, so win ratios
+    # wouldn't match the Arrow results exactly.  The table is written with the
+    # json module instead, whose floats round-trip exactly.
+    body = {
+        "schema": pd.io.json.build_table_schema(df, index=False),
+        "data": df.astype(object).where(df.notna(), None).to_dict("records"),
+    }
+    return json.dumps(body, default=json_default).encode("utf-8"), json_content_type
+
+
+def json_default(value):
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"can't encode {type(value).__name__} as JSON")
+
+
+def decode_frame(body, content_type):
+    if content_type == arrow_content_type:
+        import pyarrow as pa
+
+        return pa.ipc.open_stream(body).read_all().to_pandas()
+    return pd.read_json(io.StringIO(body.decode("utf-8")), orient="table", precise_float=True)
+
+
+class LRUCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+# MetaStore loads the frames for a meta on first use.  Metas are named by the
+# stem of their definition file in metas_dir.  Each meta has its own lock, so
+# only requests for a meta that is loading wait for it; loaded metas are read
+# without locking.  Builds of different metas share output/cache and its build
+# state file, so they run one at a time under build_lock.
+class MetaStore:
+    def __init__(
+        self,
+        metas_dir="metas",
+        data_dir="data",
+        output_dir="output",
+        cards_file="data/cards/cards.json",
+    ):
+        self.metas_dir = metas_dir
+        self.data_dir = data_dir
+        self.output_dir = output_dir
+        self.cards_file = cards_file
+        self.frames = {}
+        self.lock = threading.Lock()
+        self.meta_locks = {}
+        self.build_lock = threading.Lock()
+
+    def names(self):
+        return ep.get_registered_metas(self.metas_dir)
+
+    def get(self, name):
+        frames = self.frames.get(name)
+        if frames is not None:
+            return frames
+        if name not in self.names():
+            raise KeyError(f"unknown meta {name}")
+        with self.lock:
+            meta_lock = self.meta_locks.setdefault(name, threading.Lock())
+        with meta_lock:
+            if name not in self.frames:
+                self.frames[name] = self.load(name)
+            return self.frames[name]
+
+    def load(self, name):
+        meta_file = os.path.join(self.metas_dir, f"{name}.json")
+        with self.build_lock:
+            epiphany_build.build_meta(
+                meta_file,
+                self.data_dir,
+                self.output_dir,
+                self.cards_file,
+                figures=False,
+                log=lambda msg: None,
+            )
+        prefix = ep.get_meta(meta_file)["file_prefix"]
+        cache_dir = os.path.join(self.output_dir, "cache")
+        return {
+            "flattened": pd.read_pickle(os.path.join(cache_dir, f"{prefix}-flattened.pkl")),
+            "paired": pd.read_pickle(os.path.join(cache_dir, f"{prefix}-paired.pkl")),
+        }
+
+
+class AnalyticsService:
+    def __init__(self, store, cache_size=256):
+        self.store = store
+        self.cache = LRUCache(cache_size)
+
+    # handle returns (status, body, content type) for a request path and query
+    # string.
+    def handle(self, path, query):
+        params = urllib.parse.parse_qs(query)
+        function = path.strip("/")
+        if function == "metas":
+            return 200, json.dumps(self.store.names()).encode("utf-8"), json_content_type
+        if function == "stats":
+            stats = {
+                "hits": self.cache.hits,
+                "misses": self.cache.misses,
+                "entries": len(self.cache.entries),
+                "loaded_metas": sorted(self.store.frames),
+            }
+            return 200, json.dumps(stats).encode("utf-8"), json_content_type
+        if function not in service_functions:
+            return 404, f"unknown function {function}".encode("utf-8"), "text/plain"
+
+        meta = params.get("meta", [None])[0]
+        if meta is None:
+            return 400, b"missing meta parameter", "text/plain"
+        fmt = params.get("format", ["json"])[0]
+        if fmt not in ["json", "arrow"]:
+            return 400, f"unsupported format {fmt}".encode("utf-8"), "text/plain"
+        if fmt == "arrow" and not epiphany_build.parquet_available():
+            return 406, b"arrow format requires pyarrow on the server", "text/plain"
+        filters = tuple((c, tuple(sorted(params[c]))) for c in filter_columns if c in params)
+        players = tuple(sorted(params.get("player", [])))
+
+        key = (function, meta, filters, players, fmt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return (200,) + cached
+
+        try:
+            frames = self.store.get(meta)
+        except KeyError as e:
+            return 404, e.args[0].encode("utf-8"), "text/plain"
+
+        frame_name, fn = service_functions[function]
+        df = frames[frame_name]
+        for column, values in filters:
+            df = df[df[column].isin(values)]
+        if fn is None:
+            if not players:
+                return 400, b"missing player parameter", "text/plain"
+            result = get_player_match_lookup(function, df, players)
+        else:
+            result = fn(df)
+
+        encoded = encode_frame(result, fmt)
+        self.cache.put(key, encoded)
+        return (200,) + encoded
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            try:
+                status, body, content_type = service.handle(url.path, url.query)
+            except Exception as e:
+                status, body, content_type = 500, repr(e).encode("utf-8"), "text/plain"
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class AnalyticsServer(ThreadingHTTPServer):
+    # the socketserver default backlog of 5 makes bursts of notebook requests
+    # wait on SYN retries
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def make_server(service, host="127.0.0.1", port=default_port):
+    assert ipaddress.ip_address(
+        host
+    ).is_loopback, f"refusing to bind to non-loopback address {host}"
+    return AnalyticsServer((host, port), make_handler(service))
+
+
+def serve(
+    host="127.0.0.1",
+    port=default_port,
+    metas_dir="metas",
+    data_dir="data",
+    output_dir="output",
+    cards_file="data/cards/cards.json",
+    cache_size=256,
+    preload=(),
+):
+    store = MetaStore(metas_dir, data_dir, output_dir, cards_file)
+    for name in preload:
+        store.get(name)
+    server = make_server(AnalyticsService(store, cache_size), host, port)
+    print(f"serving {', '.join(store.names())} on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# Client fetches results from a running service.  Its methods take the meta
+# name and the same filters as the service, e.g.
+#
+# client = Client()
+# client.get_paired_winrate("rwr-2024-05", YM="2024-05")
+# client.get_player_matches("rwr-2024-05", "xdg", "aksu")
+class Client:
+    def __init__(self, url=f"http://127.0.0.1:{default_port}", format="json", timeout=300):
+        self.url = url.rstrip("/")
+        self.format = format
+        self.timeout = timeout
+
+    def request(self, path, **params):
+        query = urllib.parse.urlencode(
+            [
+                (k, v)
+                for k, vs in params.items()
+                for v in (vs if isinstance(vs, (list, tuple)) else [vs])
+            ]
+        )
+        try:
+            with urllib.request.urlopen(f"{self.url}/{path}?{query}", timeout=self.timeout) as r:
+                return r.read(), r.headers.get("Content-Type")
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"{path}: {e.code} {e.read().decode('utf-8', 'replace')}") from None
+
+    def get(self, function, meta, **filters) -> pd.DataFrame:
+        body, content_type = self.request(function, meta=meta, format=self.format, **filters)
+        return decode_frame(body, content_type)
+
+    def metas(self):
+        return json.loads(self.request("metas")[0])
+
+    def stats(self):
+        return json.loads(self.request("stats")[0])
+
+    def get_runner_win_rate(self, meta, **filters) -> pd.DataFrame:
+        return self.get("get_runner_win_rate", meta, **filters)
+
+    def get_corp_win_rate(self, meta, **filters) -> pd.DataFrame:
+        return self.get("get_corp_win_rate", meta, **filters)
+
+    def get_runner_win_rate_by_event_month(self, meta, **filters) -> pd.DataFrame:
+        return self.get("get_runner_win_rate_by_event_month", meta, **filters)
+
+    def get_corp_win_rate_by_event_month(self, meta, **filters) -> pd.DataFrame:
+        return self.get("get_corp_win_rate_by_event_month", meta, **filters)
+
+    def get_corp_popularity_by_month(self, meta, **filters) -> pd.DataFrame:
+        return self.get("get_corp_popularity_by_month", meta, **filters)
+
+    def get_runner_popularity_by_month(self, meta, **filters) -> pd.DataFrame:
+        return self.get("get_runner_popularity_by_month", meta, **filters)
+
+    def get_paired_winrate(self, meta, **filters) -> pd.DataFrame:
+        return self.get("get_paired_winrate", meta, **filters)
+
+    def get_player_corp_matches(self, meta, *players, **filters) -> pd.DataFrame:
+        return self.get("get_player_corp_matches", meta, player=list(players), **filters)
+
+    def get_player_runner_matches(self, meta, *players, **filters) -> pd.DataFrame:
+        return self.get("get_player_runner_matches", meta, player=list(players), **filters)
+
+    def get_player_matches(self, meta, *players, **filters) -> pd.DataFrame:
+        return self.get("get_player_matches", meta, player=list(players), **filters)
+
+
+# load_test sends requests from concurrency threads and returns requests per
+# second and latency percentiles in milliseconds.  paths are cycled through, so
+# a mix of cached and uncached requests can be measured.
+def load_test(url, paths, requests=1000, concurrency=8):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        local = []
+        for i in counter:
+            path = paths[i % len(paths)]
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f"{url}{path}") as r:
+                    r.read()
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    ms = pd.Series(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": ms.quantile(0.5),
+        "p90_ms": ms.quantile(0.9),
+        "p99_ms": ms.quantile(0.99),
+        "max_ms": ms.max(),
+    }
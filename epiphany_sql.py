@@ -0,0 +1,174 @@
+import os
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# SQL queries over the match corpus with DuckDB
+#
+# DuckDB is an optional dependency (`pip install duckdb`).  A connection gets
+# two views, "flattened" and "paired", with the columns of the frames returned
+# by aggregate_tournament_data.  The views can point at live frames or at
+# columnar files such as the Parquet exports written by `./epiphany build`, in
+# which case DuckDB scans them out-of-core on all cores instead of loading the
+# corpus into memory first.
+#
+# con = sql.connect()
+# sql.register_meta(con, "rwr-2024-05")
+# sql.get_corp_win_rate(con, where="rank <= ?", params=[16])
+# sql.query(con, "SELECT round, AVG(corpWin) FROM flattened GROUP BY round")
+#
+# The get_* functions mirror the pandas functions of the same name in epiphany
+# and return frames with the same columns, so their results can be passed to
+# the existing plotting helpers.  DuckDB sums are cast back to BIGINT so counts
+# come back as integers, as they do from pandas.  Each takes an optional where clause with '?'
+# placeholders and params, applied to the rows before aggregation.
+
+view_names = ["flattened", "paired"]
+
+
+# connect returns a DuckDB connection.  threads and memory_limit (e.g. "4GB")
+# are passed to DuckDB; by default it uses every core and 80% of RAM, spilling
+# to temp_directory beyond that.
+def connect(database=":memory:", threads=None, memory_limit=None, temp_directory=None):
+    if duckdb is None:
+        raise ImportError("epiphany_sql requires duckdb; install it with `pip install duckdb`")
+    con = duckdb.connect(database)
+    if threads is not None:
+        con.execute(f"SET threads = {int(threads)}")
+    if memory_limit is not None:
+        con.execute("SET memory_limit = ?", [memory_limit])
+    if temp_directory is not None:
+        con.execute("SET temp_directory = ?", [temp_directory])
+    return con
+
+
+# register_frames exposes in-memory frames, e.g. from aggregate_tournament_data,
+# as the flattened and paired views.
+def register_frames(con, flattened=None, paired=None):
+    for name, df in zip(view_names, [flattened, paired]):
+        if df is not None:
+            con.register(name, df)
+    return con
+
+
+def file_scan(path):
+    if path.endswith(".parquet"):
+        return "read_parquet(?)"
+    if path.endswith(".csv"):
+        return "read_csv_auto(?)"
+    raise ValueError(f"unsupported file type for {path}; expected .parquet or .csv")
+
+
+# register_files creates the flattened and paired views over Parquet or CSV
+# files.  Paths may be globs, e.g. "output/*-flattened-matches.parquet".
+def register_files(con, flattened=None, paired=None):
+    for name, path in zip(view_names, [flattened, paired]):
+        if path is None:
+            continue
+        # view definitions can't take parameters, so the path is inlined
+        scan = file_scan(path).replace("?", "'" + path.replace("'", "''") + "'")
+        con.execute(f"CREATE OR REPLACE VIEW {name} AS SELECT * FROM {scan}")
+    return con
+
+
+# register_meta registers the exports that `./epiphany build` wrote for a meta
+# file prefix, preferring Parquet over CSV.
+def register_meta(con, file_prefix, output_dir="output"):
+    paths = []
+    for frame in ["flattened", "paired"]:
+        base = os.path.join(output_dir, f"{file_prefix}-{frame}-matches")
+        if os.path.exists(f"{base}.parquet"):
+            paths.append(f"{base}.parquet")
+        elif os.path.exists(f"{base}.csv"):
+            paths.append(f"{base}.csv")
+        else:
+            raise FileNotFoundError(f"no {frame} export for {file_prefix} in {output_dir}")
+    return register_files(con, *paths)
+
+
+def query(con, sql, params=None) -> pd.DataFrame:
+    return con.execute(sql, params or []).df()
+
+
+def where_clause(where, *not_null):
+    conditions = [f"{c} IS NOT NULL" for c in not_null]
+    if where:
+        conditions.append(f"({where})")
+    return "WHERE " + " AND ".join(conditions)
+
+
+def get_side_win_rate(con, side, where=None, params=None) -> pd.DataFrame:
+    return query(
+        con,
+        f"""
+        SELECT
+            {side}Identity,
+            CAST(SUM({side}Win) AS BIGINT) AS total_wins,
+            CAST(SUM({side}Play) AS BIGINT) AS matches_played,
+            CAST(SUM({side}Win) AS DOUBLE) / SUM({side}Play) AS win_ratio
+        FROM flattened
+        {where_clause(where, f"{side}Identity")}
+        GROUP BY {side}Identity
+        ORDER BY win_ratio DESC
+        """,
+        params,
+    )
+
+
+def get_runner_win_rate(con, where=None, params=None) -> pd.DataFrame:
+    return get_side_win_rate(con, "runner", where, params)
+
+
+def get_corp_win_rate(con, where=None, params=None) -> pd.DataFrame:
+    return get_side_win_rate(con, "corp", where, params)
+
+
+def get_paired_winrate(con, where=None, params=None) -> pd.DataFrame:
+    return query(
+        con,
+        f"""
+        SELECT
+            corp,
+            runner,
+            CAST(SUM(corp_wins) AS BIGINT) AS corp_wins,
+            COUNT(corp_wins) AS games_played,
+            CAST(SUM(corp_wins) AS DOUBLE) / COUNT(corp_wins) AS corp_win_ratio
+        FROM paired
+        {where_clause(where, "corp", "runner")}
+        GROUP BY corp, runner
+        ORDER BY corp, runner
+        """,
+        params,
+    )
+
+
+def get_side_popularity_by_month(con, side, where=None, params=None) -> pd.DataFrame:
+    return query(
+        con,
+        f"""
+        SELECT
+            YM,
+            {side}Identity,
+            {side}Faction,
+            COUNT(*) AS size,
+            CAST(SUM(COUNT(*)) OVER (PARTITION BY YM) AS BIGINT) AS total_by_month,
+            COUNT(*) / SUM(COUNT(*)) OVER (PARTITION BY YM) AS pct
+        FROM flattened
+        {where_clause(where, "YM", f"{side}Identity", f"{side}Faction")}
+        GROUP BY YM, {side}Identity, {side}Faction
+        ORDER BY YM, {side}Identity, {side}Faction
+        """,
+        params,
+    )
+
+
+def get_corp_popularity_by_month(con, where=None, params=None) -> pd.DataFrame:
+    return get_side_popularity_by_month(con, "corp", where, params)
+
+
+def get_runner_popularity_by_month(con, where=None, params=None) -> pd.DataFrame:
+    return get_side_popularity_by_month(con, "runner", where, params)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+import argparse
+import json
+
+import synthetic
+
+# Writes a synthetic corpus of Cobra/Aesops/ABR event files and prints the
+# matching tournaments array, e.g.
+#
+#   ./generate-synthetic-data.py synthetic-data 100 --seed 7
+
+parser = argparse.ArgumentParser(description="Generate synthetic tournament data files")
+parser.add_argument("data_dir")
+parser.add_argument("events", type=int)
+parser.add_argument("--min-players", type=int, default=8)
+parser.add_argument("--max-players", type=int, default=48)
+parser.add_argument("--cobra-rate", type=float, default=0.4, help="fraction of Cobra events")
+parser.add_argument(
+    "--single-sided-rate", type=float, default=0.3, help="fraction of single sided Cobra events"
+)
+parser.add_argument(
+    "--two-for-one-rate", type=float, default=0.05, help="fraction of 2-for-1 Cobra tables"
+)
+parser.add_argument("--start-date", default="2023-09-30")
+parser.add_argument("--cards", default="data/cards/cards.json")
+parser.add_argument("--seed", type=int, default=0)
+args = parser.parse_args()
+
+tournaments = synthetic.generate_corpus(
+    args.data_dir,
+    args.events,
+    min_players=args.min_players,
+    max_players=args.max_players,
+    cobra_rate=args.cobra_rate,
+    single_sided_rate=args.single_sided_rate,
+    two_for_one_rate=args.two_for_one_rate,
+    start_date=args.start_date,
+    cards_file=args.cards,
+    seed=args.seed,
+)
+for t in tournaments:
+    print(json.dumps(t) + ",")
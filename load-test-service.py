@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+import warnings
+
+warnings.simplefilter(action="ignore", category=FutureWarning)
+
+import argparse
+import threading
+import urllib.parse
+
+import pandas as pd
+
+import epiphany_service as svc
+
+# Load tests the analytics service and prints requests per second and latency
+# percentiles.  Without --url it starts a service in-process on a free port.
+#
+#   ./load-test-service.py --meta rwr-2024-05
+#   ./load-test-service.py --url http://127.0.0.1:8765 --meta rwr-2024-05 --concurrency 16
+
+parser = argparse.ArgumentParser(description="Load test the epiphany analytics service")
+parser.add_argument("--url", help="service to test; default starts one in-process")
+parser.add_argument("--meta", default="rwr-2024-05")
+parser.add_argument("--requests", type=int, default=2000)
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--format", default="json", choices=["json", "arrow"])
+parser.add_argument("--output-dir", default="output")
+args = parser.parse_args()
+
+url = args.url
+if url is None:
+    store = svc.MetaStore(output_dir=args.output_dir)
+    store.get(args.meta)
+    server = svc.make_server(svc.AnalyticsService(store), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+query = urllib.parse.urlencode({"meta": args.meta, "format": args.format})
+paths = [f"/{function}?{query}" for function in svc.service_functions if "player" not in function]
+paths.append(f"/get_player_matches?{query}&player=xdg")
+
+# the first pass fills the cache; the second measures warm-cache requests
+results = {
+    "cold": svc.load_test(url, paths, len(paths), 1),
+    "warm": svc.load_test(url, paths, args.requests, args.concurrency),
+}
+print(pd.DataFrame(results).to_string(float_format=lambda x: f"{x:.2f}"))
@@ -0,0 +1,361 @@
+import datetime
+import json
+import os
+import random
+
+# Functions for generating synthetic tournament data
+#
+# The generated files mirror the shape of the Cobra, Aesops and ABR exports
+# under 'data/' closely enough to exercise every branch of the epiphany
+# ingestion pipeline: byes, unplayed tables, 0-0 draws, unclaimed ABR entries,
+# missing identities, 2-for-1 tables and single elimination cuts.
+
+synthetic_factions = [
+    "haas-bioroid",
+    "jinteki",
+    "nbn",
+    "weyland-consortium",
+    "anarch",
+    "criminal",
+    "shaper",
+]
+
+
+# get_identity_pools returns lists of corp and runner identity titles from a
+# NetrunnerDB card dump, restricted to the main factions so every title parses
+# with get_short_title.
+def get_identity_pools(cards_file="data/cards/cards.json"):
+    with open(cards_file, "r", encoding="utf-8") as f:
+        cards = json.load(f)["data"]
+
+    corp_ids = []
+    runner_ids = []
+    for card in cards:
+        if card["type_code"] != "identity" or card["faction_code"] not in synthetic_factions:
+            continue
+        if ": " not in card["title"]:
+            continue
+        if card["side_code"] == "corp":
+            corp_ids.append(card["title"])
+        else:
+            runner_ids.append(card["title"])
+
+    return sorted(set(corp_ids)), sorted(set(runner_ids))
+
+
+def _pick_identity(rng, pool, missing_id_rate):
+    if rng.random() < missing_id_rate:
+        return None
+    # skew towards the front of the pool so popularity is uneven, like a real meta
+    return pool[min(int(rng.expovariate(1 / 6)), len(pool) - 1)]
+
+
+def _game_scores(rng, draw_rate):
+    # returns (corp score, runner score) for a single swiss game
+    if rng.random() < draw_rate:
+        return 1, 1
+    if rng.random() < 0.5:
+        return 3, 0
+    return 0, 3
+
+
+def _swiss_pairings(rng, ids, points):
+    # pair players with similar match points, shuffling within a score group
+    order = sorted(ids, key=lambda p: (-points[p], rng.random()))
+    pairs = [(order[i], order[i + 1]) for i in range(0, len(order) - 1, 2)]
+    bye = order[-1] if len(order) % 2 else None
+    return pairs, bye
+
+
+# generate_event returns (event data, abr claims data) for one synthetic
+# tournament.  source is "cobra" or "aesops".  Cobra events are double sided
+# unless single_sided is set; Aesops events are always single sided, as they
+# are in the real exports.  two_for_one_rate is the fraction of double sided
+# Cobra tables marked as 2-for-1.  unplayed_rate controls how often Cobra tables
+# are emitted without scores; Aesops has no unplayed form, so it only applies to
+# Cobra.  zero_draw_rate controls how often tables of either source are emitted
+# with 0-0 scores.  The flatteners skip both, counting them under the "unplayed"
+# and "zero_score_draw" rules.  first_id is the id of the first player; ids are
+# sequential.
+def generate_event(
+    source,
+    name,
+    date,
+    players=16,
+    rounds=4,
+    cut=0,
+    first_id=1,
+    single_sided=False,
+    two_for_one_rate=0.0,
+    unplayed_rate=0.01,
+    zero_draw_rate=0.01,
+    draw_rate=0.02,
+    missing_id_rate=0.01,
+    claim_rate=0.7,
+    id_pools=None,
+    seed=None,
+):
+    assert source == "cobra" or source == "aesops", f"unsupported source {source}"
+    assert cut == 0 or (cut & (cut - 1) == 0 and cut <= players), f"bad cut size {cut}"
+    rng = random.Random(seed)
+    corp_pool, runner_pool = id_pools if id_pools is not None else get_identity_pools()
+    corp_pool = rng.sample(corp_pool, len(corp_pool))
+    runner_pool = rng.sample(runner_pool, len(runner_pool))
+
+    ids = list(range(first_id, first_id + players))
+    player_data = {
+        p: {
+            "id": p,
+            "name": f"Player {p}",
+            "corpIdentity": _pick_identity(rng, corp_pool, missing_id_rate),
+            "runnerIdentity": _pick_identity(rng, runner_pool, missing_id_rate),
+        }
+        for p in ids
+    }
+    points = {p: 0 for p in ids}
+
+    event_rounds = []
+    for rnd in range(rounds):
+        pairs, bye = _swiss_pairings(rng, ids, points)
+        tables = []
+        for table_number, (p1, p2) in enumerate(pairs, start=1):
+            if rnd % 2:
+                p1, p2 = p2, p1
+            unplayed = rng.random() < unplayed_rate
+            zero_draw = not unplayed and rng.random() < zero_draw_rate
+            if source == "aesops":
+                corp_score, runner_score = _game_scores(rng, draw_rate)
+                if zero_draw:
+                    corp_score, runner_score = 0, 0
+                points[p1] += corp_score
+                points[p2] += runner_score
+                tables.append(
+                    {
+                        "corpIdentity": player_data[p1]["corpIdentity"] or "",
+                        "corpPlayer": p1,
+                        "corpScore": str(corp_score),
+                        "runnerIdentity": player_data[p2]["runnerIdentity"] or "",
+                        "runnerPlayer": p2,
+                        "runnerScore": str(runner_score),
+                        "tableNumber": table_number,
+                    }
+                )
+                continue
+
+            p1_corp, p2_runner = _game_scores(rng, draw_rate)
+            p2_corp, p1_runner = (0, 0) if single_sided else _game_scores(rng, draw_rate)
+            if zero_draw:
+                p1_corp, p2_runner, p2_corp, p1_runner = 0, 0, 0, 0
+            points[p1] += p1_corp + p1_runner
+            points[p2] += p2_corp + p2_runner
+            p1_record = {
+                "combinedScore": p1_corp + p1_runner,
+                "corpScore": p1_corp,
+                "id": p1,
+                "runnerScore": p1_runner,
+            }
+            p2_record = {
+                "combinedScore": p2_corp + p2_runner,
+                "corpScore": p2_corp,
+                "id": p2,
+                "runnerScore": p2_runner,
+            }
+            if unplayed:
+                for record in (p1_record, p2_record):
+                    record.update(combinedScore=None, corpScore=None, runnerScore=None)
+            tables.append(
+                {
+                    "eliminationGame": False,
+                    "intentionalDraw": zero_draw,
+                    "player1": p1_record,
+                    "player2": p2_record,
+                    "table": table_number,
+                    "twoForOne": not single_sided and rng.random() < two_for_one_rate,
+                }
+            )
+
+        if bye is not None:
+            points[bye] += 6 if source == "cobra" else 3
+            if source == "aesops":
+                tables.append(
+                    {
+                        "corpIdentity": player_data[bye]["corpIdentity"] or "",
+                        "corpPlayer": bye,
+                        "corpScore": "3",
+                        "runnerIdentity": "",
+                        "runnerPlayer": "(BYE)",
+                        "runnerScore": "0",
+                        "tableNumber": len(pairs) + 1,
+                    }
+                )
+            else:
+                tables.append(
+                    {
+                        "eliminationGame": False,
+                        "intentionalDraw": False,
+                        "player1": {
+                            "combinedScore": 6,
+                            "corpScore": None,
+                            "id": bye,
+                            "runnerScore": None,
+                        },
+                        "player2": {
+                            "combinedScore": 0,
+                            "corpScore": None,
+                            "id": None,
+                            "runnerScore": None,
+                        },
+                        "table": len(pairs) + 1,
+                        "twoForOne": False,
+                    }
+                )
+        event_rounds.append(tables)
+
+    standings = sorted(ids, key=lambda p: (-points[p], rng.random()))
+    for rank, p in enumerate(standings, start=1):
+        player_data[p]["rank"] = rank
+        player_data[p]["matchPoints"] = points[p]
+
+    # single elimination cut, seeded by swiss rank
+    elimination_players = []
+    if cut:
+        alive = standings[:cut]
+        eliminated = []
+        table_number = 1
+        while len(alive) > 1:
+            tables = []
+            winners = []
+            for i in range(len(alive) // 2):
+                high, low = alive[i], alive[len(alive) - 1 - i]
+                corp, runner = (high, low) if rng.random() < 0.5 else (low, high)
+                winner = corp if rng.random() < 0.5 else runner
+                loser = runner if winner == corp else corp
+                winners.append(winner)
+                eliminated.append(loser)
+                if source == "aesops":
+                    tables.append(
+                        {
+                            "corpPlayer": corp,
+                            "eliminationGame": True,
+                            "loser_id": loser,
+                            "runnerPlayer": runner,
+                            "tableNumber": table_number,
+                            "winner_id": winner,
+                        }
+                    )
+                else:
+                    tables.append(
+                        {
+                            "eliminationGame": True,
+                            "intentionalDraw": False,
+                            "player1": {"id": corp, "role": "corp", "winner": winner == corp},
+                            "player2": {"id": runner, "role": "runner", "winner": winner == runner},
+                            "table": table_number,
+                            "twoForOne": False,
+                        }
+                    )
+                table_number += 1
+            event_rounds.append(tables)
+            alive = sorted(winners, key=standings.index)
+        final_order = alive + list(reversed(eliminated))
+        elimination_players = [
+            {"id": p, "name": player_data[p]["name"], "rank": rank, "seed": standings.index(p) + 1}
+            for rank, p in enumerate(final_order, start=1)
+        ]
+
+    event = {
+        "cutToTop": cut,
+        "date": date,
+        "eliminationPlayers": elimination_players,
+        "links": [],
+        "name": name,
+        "players": [player_data[p] for p in standings],
+        "preliminaryRounds": rounds,
+        "rounds": event_rounds,
+        "uploadedFrom": "Cobra" if source == "cobra" else "AesopsTables",
+    }
+
+    claims = []
+    for p in standings:
+        if rng.random() >= claim_rate:
+            continue
+        player = player_data[p]
+        claims.append(
+            {
+                "corp_deck_identity_title": player["corpIdentity"],
+                "rank_swiss": player["rank"],
+                "runner_deck_identity_title": player["runnerIdentity"],
+                "user_id": p,
+                "user_import_name": player["name"] if rng.random() < 0.9 else None,
+                "user_name": f"abr-player-{p}",
+            }
+        )
+
+    return event, claims
+
+
+# write_event writes event and claims data to data_dir using the same
+# '{prefix}-{source}.json' and '{prefix}-abr.json' naming as real event files.
+def write_event(data_dir, prefix, source, event, claims):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, f"{prefix}-{source}.json"), "w", encoding="utf-8") as f:
+        json.dump(event, f, ensure_ascii=False)
+    with open(os.path.join(data_dir, f"{prefix}-abr.json"), "w", encoding="utf-8") as f:
+        json.dump(claims, f, ensure_ascii=False)
+
+
+# generate_corpus writes a corpus of synthetic events to data_dir and returns
+# the tournaments list to pass to aggregate_tournament_data.  Event shape (size,
+# rounds, cut, source and table style) varies per event within the given
+# bounds; the same seed always produces the same corpus.
+def generate_corpus(
+    data_dir,
+    events,
+    min_players=8,
+    max_players=48,
+    cobra_rate=0.4,
+    single_sided_rate=0.3,
+    two_for_one_rate=0.05,
+    start_date="2023-09-30",
+    cards_file="data/cards/cards.json",
+    seed=0,
+):
+    rng = random.Random(seed)
+    id_pools = get_identity_pools(cards_file)
+    date = datetime.date.fromisoformat(start_date)
+    first_id = 1000
+    tournaments = []
+
+    for n in range(events):
+        source = "cobra" if rng.random() < cobra_rate else "aesops"
+        players = rng.randint(min_players, max_players)
+        rounds = max(3, min(9, players.bit_length() + 1))
+        cut = 0
+        if players >= 16:
+            cut = rng.choice([0, 4, 8])
+        elif players >= 8:
+            cut = rng.choice([0, 4])
+
+        # spread events over weekends, a handful per day
+        if n and rng.random() < 0.25:
+            date += datetime.timedelta(days=rng.choice([1, 6]))
+        prefix = f"{date.isoformat()}-synthetic-{n:05d}"
+
+        event, claims = generate_event(
+            source,
+            f"Synthetic Event {n}",
+            date.isoformat(),
+            players=players,
+            rounds=rounds,
+            cut=cut,
+            first_id=first_id,
+            single_sided=rng.random() < single_sided_rate,
+            two_for_one_rate=two_for_one_rate,
+            id_pools=id_pools,
+            seed=rng.random(),
+        )
+        write_event(data_dir, prefix, source, event, claims)
+        tournaments.append([prefix, source])
+        first_id += players
+
+    return tournaments